@@ -6,16 +6,21 @@ de interlocutores y genera informes estructurados utilizando IA.
 """
 
 import streamlit as st
+import functools
+import hashlib
+import html
+import logging
 import os
-import tempfile
-import json
-from datetime import datetime
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from datetime import date, datetime
 from utils import (
     transcribe_audio,
     save_transcription,
-    generate_report,
+    generate_report_stream_cached,
     validate_api_keys,
-    load_transcription_from_json
+    load_transcription_from_json,
+    read_transcription_json
 )
 
 # Page configuration
@@ -26,157 +31,108 @@ st.set_page_config(
 )
 
 # Custom CSS for better styling
-st.markdown("""
-<style>
-    .top-bar {
-        background: linear-gradient(90deg, #1f77b4, #1b8fcb);
-        color: #fff;
-        padding: 0.75rem 1.25rem;
-        border-radius: 0.75rem;
-        display: flex;
-        justify-content: space-between;
-        align-items: center;
-        margin-bottom: 1.25rem;
-    }
-    .top-bar .product-name {
-        font-size: 1.1rem;
-        font-weight: 600;
-    }
-    .top-bar .product-version {
-        font-size: 0.9rem;
-        opacity: 0.85;
-    }
-    .hero {
-        background: #f7f9fc;
-        border: 1px solid #e8eef5;
-        border-radius: 0.75rem;
-        padding: 1.5rem;
-        margin-bottom: 1rem;
-    }
-    .hero h1 {
-        font-size: 2rem;
-        margin: 0 0 0.5rem 0;
-        color: #1f314f;
-    }
-    .hero p {
-        color: #51627a;
-        margin-bottom: 0;
-        line-height: 1.5;
-    }
-    .toggle-chip {
-        display: inline-flex;
-        align-items: center;
-        gap: 0.35rem;
-        background: #eef5fb;
-        color: #1f77b4;
-        border-radius: 999px;
-        padding: 0.4rem 0.85rem;
-        font-size: 0.85rem;
-        font-weight: 600;
-    }
-    .summary-card {
-        border: 1px solid #dbe5f0;
-        background: #ffffff;
-        border-radius: 0.75rem;
-        padding: 1rem;
-        margin-top: 0.75rem;
-        box-shadow: 0 4px 12px rgba(31, 79, 120, 0.05);
-    }
-    .summary-card h4 {
-        margin: 0 0 0.5rem 0;
-        font-size: 1rem;
-        color: #1f314f;
-    }
-    .summary-list {
-        margin: 0;
-        padding: 0;
-        list-style: none;
-    }
-    .summary-list li {
-        margin-bottom: 0.35rem;
-        font-size: 0.9rem;
-        color: #51627a;
-    }
-    .progress-steps {
-        display: flex;
-        align-items: center;
-        gap: 0.75rem;
-        margin-bottom: 1rem;
-        flex-wrap: wrap;
-    }
-    .progress-step {
-        display: flex;
-        align-items: center;
-        gap: 0.45rem;
-        padding: 0.5rem 0.9rem;
-        border-radius: 999px;
-        font-size: 0.85rem;
-        border: 1px solid #dbe5f0;
-        color: #51627a;
-        background: #fff;
-    }
-    .progress-step.active {
-        border-color: #1f77b4;
-        color: #1f77b4;
-        background: rgba(31, 119, 180, 0.1);
-        font-weight: 600;
-    }
-    .progress-step.done {
-        border-color: #3cc77a;
-        color: #1e8a52;
-        background: rgba(60, 199, 122, 0.1);
-    }
-    .transcript-message {
-        border: 1px solid #e8eef5;
-        padding: 0.75rem 1rem;
-        border-radius: 0.75rem;
-        background: #fbfdff;
-        margin-bottom: 0.5rem;
-    }
-    .transcript-speaker {
-        display: block;
-        font-weight: 600;
-        color: #1f77b4;
-        margin-bottom: 0.25rem;
-    }
-    .empty-state {
-        text-align: center;
-        padding: 1.75rem;
-        border: 1px dashed #cbd8e6;
-        border-radius: 0.75rem;
-        color: #51627a;
-        background: rgba(240, 245, 250, 0.6);
-    }
-    @media (max-width: 900px) {
-        .top-bar {
-            flex-direction: column;
-            align-items: flex-start;
-            gap: 0.35rem;
-        }
-    }
-</style>
-""", unsafe_allow_html=True)
+CSS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "styles.css")
+
+
+@st.cache_resource(show_spinner=False)
+def load_css(path: str, mtime: float) -> str:
+    """Read the stylesheet once per process; the mtime argument invalidates the cache when the file changes."""
+    with open(path, encoding="utf-8") as css_file:
+        return f"<style>\n{css_file.read()}</style>"
+
+
+# Streamlit's static handler serves .css as text/plain with nosniff, which browsers
+# refuse to apply, so the stylesheet is always inlined from the cached copy
+st.markdown(load_css(CSS_PATH, os.path.getmtime(CSS_PATH)), unsafe_allow_html=True)
+
+# Static HTML blocks, built once at import time
+HEADER_HTML = """
+<div class="top-bar">
+    <span class="product-name">📊 Generador de informes de visitas comerciales</span>
+    <span class="product-version">Versión 1.0 · Transcripción e informes con IA</span>
+</div>
+<div class="hero">
+    <h1>Convierte tus visitas comerciales en informes estructurados en minutos.</h1>
+    <p>Sube tu grabación, revisa la transcripción y descarga un resumen listo para compartir.</p>
+</div>
+"""
+
+EMPTY_STATE_HTML = """
+<div class="empty-state">
+    <div style="font-size:2rem;">🎧</div>
+    <p><strong>Arrastra tu grabación para empezar.</strong></p>
+    <p style="font-size:0.9rem;margin-bottom:0;">Sube una visita comercial en MP3 o cambia al modo de prueba para practicar con una transcripción guardada.</p>
+</div>
+"""
+
+QUICK_TIPS_HTML = """
+<div class="summary-card">
+    <h4>Consejos rápidos</h4>
+    <ul class="summary-list">
+        <li>Graba las visitas con el mínimo ruido de fondo.</li>
+        <li>Confirma los nombres de los interlocutores antes de compartir el informe.</li>
+        <li>Usa el modo de prueba para afinar los prompts sin volver a grabar.</li>
+    </ul>
+</div>
+"""
+
+ALL_SET_HTML = """
+<div class="summary-card" style="margin-top:1.5rem;">
+    <h4>Todo listo</h4>
+    <p style="color:#51627a;margin-bottom:0.75rem;">¿Necesitas procesar otra visita? Reinicia el flujo a continuación.</p>
+</div>
+"""
 
 # Header
-st.markdown(
-    """
-    <div class="top-bar">
-        <span class="product-name">📊 Generador de informes de visitas comerciales</span>
-        <span class="product-version">Versión 1.0 · Transcripción e informes con IA</span>
-    </div>
-    """,
-    unsafe_allow_html=True,
-)
+st.markdown(HEADER_HTML, unsafe_allow_html=True)
+
+def refresh_api_keys_status() -> None:
+    """Drop the cached API status so the next rerun checks the configuration again."""
+    validate_api_keys.clear()
+
+
+# LOG_LEVEL=DEBUG prints the transcription diagnostics from utils to the terminal;
+# unknown level names fall back to WARNING instead of stopping the app
+LOG_LEVEL = os.getenv("LOG_LEVEL", "WARNING").upper()
+if not isinstance(logging.getLevelName(LOG_LEVEL), int):
+    LOG_LEVEL = "WARNING"
+logging.basicConfig(level=LOG_LEVEL)
+
+# Set SAVE_TRANSCRIPTIONS=false where the filesystem is ephemeral to skip the JSON copy
+SAVE_TRANSCRIPTIONS = os.getenv("SAVE_TRANSCRIPTIONS", "true").lower() == "true"
+
+# Largest audio upload accepted: ~8 hours of MP3 at 128 kbps (the uploader
+# already limits the extension; browsers report MP3s under several MIME types)
+MAX_AUDIO_BYTES = 400 * 1048576
+
+# How long the success message waits for the background transcription save
+SAVE_RESULT_TIMEOUT = 30
+
+# Seconds between status label updates while a transcription runs in the background
+TRANSCRIBE_POLL_INTERVAL = 1.0
+
+# Transcriptions running at once across all sessions (each holds a thread for
+# minutes while AssemblyAI works); further jobs wait in the queue
+try:
+    TRANSCRIBE_WORKERS = max(1, int(os.getenv("TRANSCRIBE_WORKERS", "4")))
+except ValueError:
+    TRANSCRIBE_WORKERS = 4
+
+# Saves are short disk writes; their own pool keeps them from queuing behind transcriptions
+SAVE_WORKERS = 2
+
+
+@st.cache_resource(show_spinner=False)
+def get_transcription_executor() -> ThreadPoolExecutor:
+    """Shared worker pool for transcriptions, kept alive across reruns and sessions."""
+    return ThreadPoolExecutor(max_workers=TRANSCRIBE_WORKERS, thread_name_prefix="repgen-transcribe")
+
+
+@st.cache_resource(show_spinner=False)
+def get_save_executor() -> ThreadPoolExecutor:
+    """Shared worker pool for transcription saves, kept alive across reruns and sessions."""
+    return ThreadPoolExecutor(max_workers=SAVE_WORKERS, thread_name_prefix="repgen-save")
 
-st.markdown(
-    """
-    <div class="hero">
-        <h1>Convierte tus visitas comerciales en informes estructurados en minutos.</h1>
-        <p>Sube tu grabación, revisa la transcripción y descarga un resumen listo para compartir.</p>
-    </div>
-    """,
-    unsafe_allow_html=True,
-)
 
 # Check API keys
 api_keys = validate_api_keys()
@@ -186,6 +142,7 @@ if not all(api_keys.values()):
     st.error(
         f"Asegúrate de configurar las siguientes claves de API en tu archivo .env o en los secretos de Streamlit: {', '.join(missing_keys)}"
     )
+    st.button("🔄 Volver a comprobar", on_click=refresh_api_keys_status)
     st.stop()
 
 # Initialize session state
@@ -200,49 +157,132 @@ if 'test_mode' not in st.session_state:
 if 'customer_name' not in st.session_state:
     st.session_state.customer_name = ""
 if 'report_date' not in st.session_state:
-    st.session_state.report_date = datetime.today().date()
+    st.session_state.report_date = date.today()
 if 'sales_person' not in st.session_state:
     st.session_state.sales_person = "Mario Casanova"
 if 'last_visit_metadata' not in st.session_state:
     st.session_state.last_visit_metadata = None
 if 'last_upload_info' not in st.session_state:
     st.session_state.last_upload_info = None
+if 'transcription_stats' not in st.session_state:
+    st.session_state.transcription_stats = None
+if 'report_filenames' not in st.session_state:
+    st.session_state.report_filenames = None
+if 'report_downloads' not in st.session_state:
+    st.session_state.report_downloads = None
+
+
+def compute_transcription_stats(transcription_data: dict) -> dict:
+    """Prepare the display aggregates once so reruns don't rescan the transcript."""
+    utterances = transcription_data['utterances']
+    metadata = transcription_data['metadata']
+    messages = []
+    for u in utterances:
+        text = u.text.strip()
+        if text:
+            messages.append((html.escape(str(u.speaker)), html.escape(text)))
+    return {
+        # Counted once in utils when the transcription was produced or loaded
+        "num_utterances": metadata['num_utterances'],
+        "num_speakers": metadata['num_speakers'],
+        # Numbered markdown list of the first 3 utterances, truncated for the verification preview
+        "preview": "\n".join(
+            f"{i}. **Interlocutor {u.speaker}:** {u.text[:150]}{'...' if len(u.text) > 150 else ''}"
+            for i, u in enumerate(utterances[:3], 1)
+        ),
+        # HTML-escaped (speaker, text) pairs for the transcript tab, empty utterances already dropped
+        "messages": messages,
+    }
+
+
+def metrics_table_html(metrics) -> str:
+    """Lay out (label, value) pairs as one HTML table so they render as a single element."""
+    # Values can come from an uploaded JSON (test mode), so escape them like the transcript
+    header = "".join(f"<th>{html.escape(str(label))}</th>" for label, _ in metrics)
+    values = "".join(f"<td>{html.escape(str(value))}</td>" for _, value in metrics)
+    return f"<table class='metric-table'><tr>{header}</tr><tr>{values}</tr></table>"
 
-def render_progress(has_upload: bool, has_transcription: bool, has_report: bool) -> None:
-    steps = [
-        {
-            "label": "Subida",
-            "status": "done" if has_upload else "active",
-        },
-        {
-            "label": "Transcripción",
-            "status": (
-                "done" if has_transcription else ("active" if has_upload else "pending")
-            ),
-        },
-        {
-            "label": "Informe IA",
-            "status": (
-                "done" if has_report else ("active" if has_transcription else "pending")
-            ),
-        },
-        {
-            "label": "Descarga",
-            "status": "done" if has_report else "pending",
-        },
+
+# (field, line template) for the visit details block, in display order
+VISIT_DETAIL_LINES = (
+    ("customer_name", "- Cliente: {customer_name}"),
+    ("report_date", "- Fecha: {report_date:%Y-%m-%d}"),
+    ("sales_person", "- Comercial: {sales_person}"),
+)
+
+
+@st.cache_data(show_spinner=False)
+def build_visit_details_section(customer_name: str, report_date, sales_person: str) -> str:
+    """Build the visit details block placed before the conversation, memoized on its inputs."""
+    values = {
+        "customer_name": customer_name,
+        "report_date": report_date,
+        "sales_person": sales_person,
+    }
+    metadata_lines = [
+        template.format_map(values) for field, template in VISIT_DETAIL_LINES if values[field]
     ]
+    if not metadata_lines:
+        return ""
+    return "\n".join(("DETALLES DE LA VISITA:", *metadata_lines, "", ""))
+
+
+@st.cache_data(show_spinner=False)
+def load_uploaded_transcription(digest: str, size: int, _uploaded_file) -> tuple:
+    """
+    Parse an uploaded transcription JSON and aggregate its stats.
+
+    Cached by the content digest and size; the file object itself is not hashed.
+    """
+    json_data = read_transcription_json(_uploaded_file, size)
+    transcription_data = load_transcription_from_json(json_data)
+    return transcription_data, compute_transcription_stats(transcription_data)
+
+
+# Progress step markup and the CSS class for each step status ("pending" has none)
+STEP_TEMPLATE = "<div class='progress-step {cls}'>{label}</div>"
+STEP_STATUS_CLASS = {"done": "done", "active": "active", "pending": ""}
+
+
+@functools.lru_cache(maxsize=None)
+def progress_html(has_upload: bool, has_transcription: bool, has_report: bool) -> str:
+    """Build the progress-steps HTML; memoized over the 8 possible state combinations."""
+    steps = (
+        ("Subida", "done" if has_upload else "active"),
+        ("Transcripción", "done" if has_transcription else ("active" if has_upload else "pending")),
+        ("Informe IA", "done" if has_report else ("active" if has_transcription else "pending")),
+        ("Descarga", "done" if has_report else "pending"),
+    )
     step_html = "".join(
-        f"<div class='progress-step {' '.join(s for s in [step['status']] if s != 'pending')}'>{step['label']}</div>"
-        for step in steps
+        STEP_TEMPLATE.format(cls=STEP_STATUS_CLASS[status], label=label)
+        for label, status in steps
+    )
+    return f"<div class='progress-steps'>{step_html}</div>"
+
+
+def progress_state() -> tuple:
+    """Current (has_upload, has_transcription, has_report) flags for the progress indicator."""
+    return (
+        bool(st.session_state.audio_filename),
+        st.session_state.transcription is not None,
+        st.session_state.report is not None,
     )
-    progress_placeholder.markdown(f"<div class='progress-steps'>{step_html}</div>", unsafe_allow_html=True)
+
+
+def request_pipeline_run() -> None:
+    """Form submit callback: flag the next run to execute the generation pipeline."""
+    st.session_state.run_pipeline = True
+
+
+def render_progress(state: tuple) -> None:
+    progress_placeholder.markdown(progress_html(*state), unsafe_allow_html=True)
 
 progress_placeholder = st.empty()
-render_progress(
-    has_upload=bool(st.session_state.audio_filename),
-    has_transcription=st.session_state.transcription is not None,
-    has_report=st.session_state.report is not None
-)
+rendered_progress = progress_state()
+render_progress(rendered_progress)
+
+# Reusable slot for the pipeline status container
+pipeline_status_slot = st.empty()
 
 # Mode selection and guidance
 with st.container():
@@ -273,8 +313,8 @@ with st.container():
                 st.subheader("Sube la transcripción en JSON")
                 uploaded_file = st.file_uploader(
                     "Elige un archivo JSON",
-                    type=["json"],
-                    help="Utiliza una transcripción exportada de una ejecución anterior."
+                    type=["json", "zst"],
+                    help="Utiliza una transcripción exportada de una ejecución anterior (.json o .json.zst)."
                 )
             else:
                 st.subheader("Sube la grabación de audio")
@@ -307,19 +347,23 @@ with st.container():
 
             st.caption("Tus archivos permanecen en este dispositivo hasta iniciar la transcripción.")
 
-            generate_clicked = st.form_submit_button(
+            st.form_submit_button(
                 "🚀 Generar informe",
+                on_click=request_pipeline_run,
                 use_container_width=True
             )
 
     with info_col:
         file_info = None
         if uploaded_file is not None:
-            file_size_kb = uploaded_file.size / 1024
-            file_size_mb = file_size_kb / 1024 if file_size_kb > 1024 else file_size_kb
-            size_str = f"{file_size_mb:.2f} MB" if file_size_kb > 1024 else f"{file_size_kb:.1f} KB"
+            size_bytes = uploaded_file.size
+            size_str = (
+                f"{size_bytes / 1048576:.2f} MB"
+                if size_bytes > 1048576
+                else f"{size_bytes / 1024:.1f} KB"
+            )
             file_info = {
-                "name": uploaded_file.name,
+                "name": html.escape(uploaded_file.name),
                 "size": size_str,
                 "mode": "Transcripción JSON" if st.session_state.test_mode else "Audio MP3"
             }
@@ -344,209 +388,244 @@ with st.container():
                 unsafe_allow_html=True
             )
         else:
-            st.markdown(
-                """
-                <div class="empty-state">
-                    <div style="font-size:2rem;">🎧</div>
-                    <p><strong>Arrastra tu grabación para empezar.</strong></p>
-                    <p style="font-size:0.9rem;margin-bottom:0;">Sube una visita comercial en MP3 o cambia al modo de prueba para practicar con una transcripción guardada.</p>
-                </div>
-                """,
-                unsafe_allow_html=True
-            )
-        st.markdown(
-            """
-            <div class="summary-card">
-                <h4>Consejos rápidos</h4>
-                <ul class="summary-list">
-                    <li>Graba las visitas con el mínimo ruido de fondo.</li>
-                    <li>Confirma los nombres de los interlocutores antes de compartir el informe.</li>
-                    <li>Usa el modo de prueba para afinar los prompts sin volver a grabar.</li>
-                </ul>
-            </div>
-            """,
-            unsafe_allow_html=True
-        )
+            st.markdown(EMPTY_STATE_HTML, unsafe_allow_html=True)
+        st.markdown(QUICK_TIPS_HTML, unsafe_allow_html=True)
 
-# Trigger report generation when the form is submitted
-if generate_clicked:
+# Trigger report generation when the form is submitted (flag is consumed once)
+if st.session_state.pop('run_pipeline', False):
     if uploaded_file is None:
         st.warning("Sube un archivo antes de generar el informe.")
+    elif not st.session_state.test_mode and uploaded_file.size > MAX_AUDIO_BYTES:
+        st.error(
+            f"❌ El archivo ocupa {uploaded_file.size / 1048576:.0f} MB; "
+            f"el máximo admitido es {MAX_AUDIO_BYTES // 1048576} MB."
+        )
     else:
+        save_future = None
         try:
-            # Progress tracking
-            progress_bar = st.progress(0)
-            status_text = st.empty()
-            
-            if st.session_state.test_mode:
-                # Test Mode: Load transcription from JSON
-                status_text.text("📄 Cargando la transcripción desde JSON...")
-                progress_bar.progress(20)
-                
-                uploaded_file.seek(0)
-                try:
-                    json_data = json.load(uploaded_file)
-                except json.JSONDecodeError as e:
-                    raise ValueError(f"Archivo JSON no válido: {e}")
-                
-                with st.spinner("Procesando los datos de la transcripción..."):
-                    transcription_data = load_transcription_from_json(json_data)
+            # One status container carries every step of the run instead of a separate
+            # progress bar, status line and spinner per step
+            with pipeline_status_slot.status("⏳ Procesando...", expanded=True) as status:
+                if st.session_state.test_mode:
+                    # Test Mode: Load transcription from JSON
+                    status.update(label="📄 Cargando la transcripción desde JSON...")
+                    
+                    digest = hashlib.blake2b(uploaded_file.getbuffer()).hexdigest()
+                    transcription_data, stats = load_uploaded_transcription(
+                        digest, uploaded_file.size, uploaded_file
+                    )
                     st.session_state.transcription = transcription_data
-                    progress_bar.progress(40)
-                
-                status_text.text("✓ ¡Transcripción cargada!")
-                
-                # Show info
-                num_utterances = len(transcription_data.get('utterances', []))
-                num_speakers = len(set(u['speaker'] for u in transcription_data.get('utterances', [])))
-                st.info(f"ℹ️ Se cargaron {num_speakers} interlocutores con {num_utterances} intervenciones desde el JSON")
-                
-            else:
-                # Normal Mode: Transcribe audio with AssemblyAI
-                uploaded_file.seek(0)
-                
-                with tempfile.NamedTemporaryFile(delete=False, suffix=".mp3", mode='wb') as tmp_file:
-                    tmp_file.write(uploaded_file.read())
-                    tmp_file_path = tmp_file.name
-                    tmp_file.flush()
-                    os.fsync(tmp_file.fileno())
-                
-                # Verify file was created and has content
-                if not os.path.exists(tmp_file_path):
-                    raise Exception("No se pudo crear el archivo temporal")
-                
-                file_size = os.path.getsize(tmp_file_path)
-                if file_size == 0:
-                    raise Exception("El archivo subido está vacío")
-                
-                # Step 1: Transcribe audio
-                status_text.text(f"🎤 Cargando y transcribiendo el audio ({file_size / 1024 / 1024:.2f} MB)...")
-                progress_bar.progress(10)
-                
-                with st.spinner("Transcribiendo audio... Puede tardar algunos minutos."):
-                    transcription_data = transcribe_audio(tmp_file_path)
+                    st.session_state.transcription_stats = stats
+                    
+                    # Show info
+                    num_utterances = stats["num_utterances"]
+                    num_speakers = stats["num_speakers"]
+                    st.write(f"ℹ️ Se cargaron {num_speakers} interlocutores con {num_utterances} intervenciones desde el JSON")
+                    
+                else:
+                    # Normal Mode: Transcribe audio with AssemblyAI
+                    # The upload is already in memory: send it to AssemblyAI as-is instead
+                    # of writing it to a temporary file and reading it back
+                    file_size = uploaded_file.size
+                    if file_size == 0:
+                        raise Exception("El archivo subido está vacío")
+                    
+                    # Step 1: Transcribe audio
+                    size_label = f"{file_size / 1048576:.2f} MB"
+                    status.update(label=f"🎤 Cargando y transcribiendo el audio ({size_label})...")
+                    
+                    # Run the blocking transcription on a worker thread and show the
+                    # elapsed time while it waits on AssemblyAI, or that it is still
+                    # queued while other sessions' transcriptions hold every worker.
+                    # transcribe_audio() rewinds the stream itself after measuring it
+                    transcribe_future = get_transcription_executor().submit(transcribe_audio, uploaded_file)
+                    queued = time.monotonic()
+                    started = None
+                    while not transcribe_future.done():
+                        time.sleep(TRANSCRIBE_POLL_INTERVAL)
+                        if transcribe_future.running():
+                            if started is None:
+                                started = time.monotonic()
+                            label = f"🎤 Transcribiendo el audio ({size_label}) · {time.monotonic() - started:.0f} s..."
+                        else:
+                            label = (
+                                "⏳ En cola: esperando a que terminen otras transcripciones · "
+                                f"{time.monotonic() - queued:.0f} s..."
+                            )
+                        status.update(label=label)
+                    transcription_data = transcribe_future.result()
                     st.session_state.transcription = transcription_data
-                    progress_bar.progress(50)
-                
-                # Clean up temp file
-                os.unlink(tmp_file_path)
-                
-                status_text.text("✓ ¡Transcripción completada!")
-                
-                # Show detailed info about the transcription for verification
-                metadata = transcription_data.get('metadata', {})
-                num_utterances = len(transcription_data.get('utterances', []))
-                num_speakers = len(set(u['speaker'] for u in transcription_data.get('utterances', [])))
-                
-                # Display critical information for debugging
-                st.success("✅ ¡Transcripción completada!")
-                
-                col1, col2, col3, col4 = st.columns(4)
-                with col1:
-                    st.metric("Interlocutores", num_speakers)
-                with col2:
-                    st.metric("Intervenciones", num_utterances)
-                with col3:
+                    stats = compute_transcription_stats(transcription_data)
+                    st.session_state.transcription_stats = stats
+                    
+                    # Show detailed info about the transcription for verification
+                    metadata = transcription_data.get('metadata', {})
+                    num_utterances = stats["num_utterances"]
+                    num_speakers = stats["num_speakers"]
+                    
+                    # Display critical information for debugging
+                    st.write("✅ ¡Transcripción completada!")
+                    
                     language = metadata.get('language_code', 'unknown')
-                    st.metric("Idioma", language.upper() if language != 'unknown' else 'N/A')
-                with col4:
                     confidence = metadata.get('language_confidence')
-                    if confidence is not None:
-                        st.metric("Confianza", f"{confidence:.1%}")
-                    else:
-                        st.metric("Confianza", "N/A")
+                    st.markdown(
+                        metrics_table_html((
+                            ("Interlocutores", num_speakers),
+                            ("Intervenciones", num_utterances),
+                            ("Idioma", str(language).upper() if language != 'unknown' else 'N/A'),
+                            ("Confianza", f"{confidence:.1%}" if confidence is not None else "N/A"),
+                        )),
+                        unsafe_allow_html=True
+                    )
+                    
+                    # Show first few utterances for verification and the transcript ID for support
+                    st.markdown(
+                        f"**🔍 Primeras 3 intervenciones (verificación):**\n\n{stats['preview']}\n\n"
+                        f"🔑 **ID de transcripción:** `{metadata.get('transcript_id', 'N/A')}`"
+                    )
+                    
+                    # Step 2: Save transcription (only in normal mode) in the background
+                    # so the disk write overlaps with the report generation request
+                    transcription_data['metadata']['original_filename'] = uploaded_file.name
+                    if SAVE_TRANSCRIPTIONS:
+                        save_future = get_save_executor().submit(
+                            save_transcription, transcription_data, uploaded_file.name
+                        )
                 
-                # Show first few utterances for verification
-                st.markdown("**🔍 Primeras 3 intervenciones (verificación):**")
-                for i, utterance in enumerate(transcription_data.get('utterances', [])[:3], 1):
-                    speaker = utterance.get('speaker', '?')
-                    text = utterance.get('text', '')[:150]
-                    st.caption(f"{i}. **Interlocutor {speaker}:** {text}{'...' if len(utterance.get('text', '')) > 150 else ''}")
+                # Step 3: Generate report (both modes)
+                visit_metadata = {
+                    "customer_name": st.session_state.customer_name.strip(),
+                    "report_date": st.session_state.report_date,
+                    "sales_person": st.session_state.sales_person.strip()
+                }
+                st.session_state.last_visit_metadata = visit_metadata
+
+                metadata_section = build_visit_details_section(
+                    visit_metadata["customer_name"],
+                    visit_metadata["report_date"],
+                    visit_metadata["sales_person"]
+                )
+
+                status.update(label="🤖 Generando informe de visita comercial con GPT-5...")
                 
-                # Show transcript ID for support
-                st.info(f"🔑 **ID de transcripción:** `{metadata.get('transcript_id', 'N/A')}`")
+                # Show the report as GPT-5 writes it; cached reports appear at once
+                report = st.write_stream(
+                    generate_report_stream_cached(transcription_data['formatted_conversation'], metadata_section)
+                )
+                st.session_state.report = report
+                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+                st.session_state.report_filenames = (
+                    f"informe_visita_comercial_{timestamp}.md",
+                    f"transcripcion_{timestamp}.txt",
+                )
+                # Encode the download payloads once; reruns hand the same bytes to the buttons
+                st.session_state.report_downloads = (
+                    report.encode("utf-8"),
+                    transcription_data['formatted_conversation'].encode("utf-8"),
+                )
                 
-                # Step 2: Save transcription (only in normal mode)
-                status_text.text("💾 Guardando los datos de la transcripción...")
-                transcription_data['metadata']['original_filename'] = uploaded_file.name
-                save_path = save_transcription(transcription_data, uploaded_file.name)
-                progress_bar.progress(60)
-                st.info(f"💾 Transcripción guardada: {save_path}")
-            
-            # Step 3: Generate report (both modes)
-            visit_metadata = {
-                "customer_name": st.session_state.customer_name.strip(),
-                "report_date": st.session_state.report_date,
-                "sales_person": st.session_state.sales_person.strip()
-            }
-            st.session_state.last_visit_metadata = visit_metadata
+                status.update(label="🎉 ¡Informe generado correctamente!", state="complete", expanded=False)
 
-            metadata_lines = []
-            if visit_metadata["customer_name"]:
-                metadata_lines.append(f"- Cliente: {visit_metadata['customer_name']}")
-            if visit_metadata["report_date"]:
-                metadata_lines.append(f"- Fecha: {visit_metadata['report_date'].strftime('%Y-%m-%d')}")
-            if visit_metadata["sales_person"]:
-                metadata_lines.append(f"- Comercial: {visit_metadata['sales_person']}")
-
-            metadata_section = ""
-            if metadata_lines:
-                metadata_section = "DETALLES DE LA VISITA:\n" + "\n".join(metadata_lines) + "\n\n"
-
-            conversation_for_report = metadata_section + transcription_data['formatted_conversation']
-
-            status_text.text("🤖 Generando informe de visita comercial con GPT-5...")
-            progress_bar.progress(70)
-            
-            with st.spinner("Analizando la conversación y generando el informe..."):
-                report = generate_report(conversation_for_report)
-                st.session_state.report = report
-                progress_bar.progress(100)
-            
-            status_text.text("✓ ¡Informe generado correctamente!")
-            
-            # Clean up temporary file (only in normal mode)
-            if 'tmp_file_path' in locals() and os.path.exists(tmp_file_path):
-                os.unlink(tmp_file_path)
-            
-            # Success message
-            st.success("🎉 ¡Informe generado correctamente!")
-            if 'save_path' in locals():
-                st.info(f"📁 Transcripción guardada en: {save_path}")
+            # Wait for the background save; a failed save must not hide a generated report
+            if save_future is not None:
+                try:
+                    save_path = save_future.result(timeout=SAVE_RESULT_TIMEOUT)
+                except FutureTimeoutError:
+                    st.info("📁 La transcripción se sigue guardando en segundo plano.")
+                except Exception as save_error:
+                    st.warning(f"⚠️ No se pudo guardar la transcripción: {save_error}")
+                else:
+                    st.info(f"📁 Transcripción guardada en: {save_path}")
             
         except Exception as e:
             st.error(f"❌ Error: {str(e)}")
             st.error("Revisa tus claves de API e inténtalo de nuevo.")
-            # Clean up temp file if it exists
-            if 'tmp_file_path' in locals() and os.path.exists(tmp_file_path):
-                os.unlink(tmp_file_path)
-
-# Update progress indicator
-render_progress(
-    has_upload=bool(st.session_state.audio_filename),
-    has_transcription=st.session_state.transcription is not None,
-    has_report=st.session_state.report is not None
-)
 
-# Display Results
-if st.session_state.report:
+# Update progress indicator only if this run changed it (new upload or pipeline run)
+if progress_state() != rendered_progress:
+    render_progress(progress_state())
+
+@st.fragment
+def render_downloads() -> None:
+    """Render the download buttons; a click reruns only this fragment, not the whole results panel."""
+    # Filenames and payloads were fixed at generation time so they stay stable across reruns
+    report_filename, transcription_filename = st.session_state.report_filenames
+    report_bytes, transcript_bytes = st.session_state.report_downloads
+    dl_col1, dl_col2 = st.columns(2)
+    with dl_col1:
+        st.download_button(
+            label="⬇️ Descargar informe (Markdown)",
+            data=report_bytes,
+            file_name=report_filename,
+            mime="text/markdown",
+            use_container_width=True,
+            key="download_report_markdown",
+        )
+    with dl_col2:
+        st.download_button(
+            label="⬇️ Descargar transcripción (Texto)",
+            data=transcript_bytes,
+            file_name=transcription_filename,
+            mime="text/plain",
+            use_container_width=True,
+            disabled=not transcript_bytes,
+            key="download_transcript_text_summary",
+        )
+
+
+@st.fragment
+def render_transcript() -> None:
+    """Render the transcript tab as its own fragment, isolated from the report tab's reruns."""
+    if st.session_state.transcription:
+        transcription = st.session_state.transcription
+        metadata = transcription.get('metadata', {})
+        stats = st.session_state.transcription_stats
+        if stats is None:
+            stats = compute_transcription_stats(transcription)
+            st.session_state.transcription_stats = stats
+
+        with st.expander("Detalles de la grabación", expanded=False):
+            language_code = metadata.get('language_code', 'N/A')
+            duration = metadata.get('audio_duration')
+            st.markdown(
+                metrics_table_html((
+                    ("Idioma", str(language_code).upper() if language_code else "N/A"),
+                    ("Interlocutores", stats["num_speakers"]),
+                    ("Duración", f"{duration/1000:.1f}s" if duration else "N/A"),
+                )),
+                unsafe_allow_html=True
+            )
+
+        # Render the whole transcript in a single element instead of one per utterance
+        message_parts = [
+            f"<div class='transcript-message'>"
+            f"<span class='transcript-speaker'>Interlocutor {speaker}</span>"
+            f"<div>{text}</div>"
+            f"</div>"
+            for speaker, text in stats["messages"]
+        ]
+        st.markdown("".join(message_parts), unsafe_allow_html=True)
+    else:
+        st.info("No hay datos de transcripción disponibles.")
+
+
+@st.fragment
+def render_results() -> None:
+    """Render the results panel; its widgets only rerun this fragment."""
     st.markdown("---")
     st.subheader("📊 Resultados")
 
     visit_metadata = st.session_state.get('last_visit_metadata')
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    report_filename = f"informe_visita_comercial_{timestamp}.md"
-    transcription_filename = f"transcripcion_{timestamp}.txt"
 
     # Create tabs for different views
     tab1, tab2 = st.tabs(["📄 Informe", "🎙️ Transcripción"])
 
     with tab1:
         if visit_metadata:
-            customer_display = visit_metadata.get("customer_name") or "N/A"
+            customer_display = html.escape(visit_metadata.get("customer_name") or "N/A")
             date_value = visit_metadata.get("report_date")
             date_display = date_value.strftime("%Y-%m-%d") if date_value else "N/A"
-            salesperson_display = visit_metadata.get("sales_person") or "N/A"
+            salesperson_display = html.escape(visit_metadata.get("sales_person") or "N/A")
             st.markdown(
                 f"""
                 <div class="summary-card">
@@ -563,92 +642,32 @@ if st.session_state.report:
 
         st.markdown(st.session_state.report)
 
-        dl_col1, dl_col2 = st.columns(2)
-        with dl_col1:
-            st.download_button(
-                label="⬇️ Descargar informe (Markdown)",
-                data=st.session_state.report,
-                file_name=report_filename,
-                mime="text/markdown",
-                use_container_width=True,
-                key="download_report_markdown",
-            )
-        with dl_col2:
-            st.download_button(
-                label="⬇️ Descargar transcripción (Texto)",
-                data=st.session_state.transcription['formatted_conversation']
-                if st.session_state.transcription
-                else "",
-                file_name=transcription_filename,
-                mime="text/plain",
-                use_container_width=True,
-                disabled=st.session_state.transcription is None,
-                key="download_transcript_text_summary",
-            )
+        render_downloads()
 
     with tab2:
-        if st.session_state.transcription:
-            transcription = st.session_state.transcription
-            metadata = transcription.get('metadata', {})
-            utterances = transcription.get('utterances', [])
-
-            with st.expander("Detalles de la grabación", expanded=False):
-                detail_col1, detail_col2, detail_col3 = st.columns(3)
-                with detail_col1:
-                    language_code = metadata.get('language_code', 'N/A')
-                    st.metric("Idioma", language_code.upper() if language_code else "N/A")
-                with detail_col2:
-                    st.metric("Interlocutores", len(set(u['speaker'] for u in utterances)))
-                with detail_col3:
-                    duration = metadata.get('audio_duration')
-                    st.metric("Duración", f"{duration/1000:.1f}s" if duration else "N/A")
-
-            transcript_container = st.container()
-            for idx, utterance in enumerate(utterances):
-                speaker = utterance.get('speaker', '?')
-                text = (utterance.get('text') or "").strip()
-                if not text:
-                    continue
-                transcript_container.markdown(
-                    f"""
-                    <div class="transcript-message">
-                        <span class="transcript-speaker">Interlocutor {speaker}</span>
-                        <div>{text}</div>
-                    </div>
-                    """,
-                    unsafe_allow_html=True,
-                )
+        render_transcript()
 
-            st.download_button(
-                label="⬇️ Descargar transcripción (Texto)",
-                data=transcription['formatted_conversation'],
-                file_name=transcription_filename,
-                mime="text/plain",
-                use_container_width=True,
-                key="download_transcript_text_detail",
-            )
-        else:
-            st.info("No hay datos de transcripción disponibles.")
-
-    st.markdown(
-        """
-        <div class="summary-card" style="margin-top:1.5rem;">
-            <h4>Todo listo</h4>
-            <p style="color:#51627a;margin-bottom:0.75rem;">¿Necesitas procesar otra visita? Reinicia el flujo a continuación.</p>
-        </div>
-        """,
-        unsafe_allow_html=True,
-    )
+    st.markdown(ALL_SET_HTML, unsafe_allow_html=True)
     if st.button("Procesar otro archivo", use_container_width=True):
         st.session_state.report = None
         st.session_state.transcription = None
+        st.session_state.transcription_stats = None
         st.session_state.audio_filename = None
         st.session_state.last_upload_info = None
         st.session_state.last_visit_metadata = None
+        st.session_state.report_filenames = None
+        st.session_state.report_downloads = None
         st.rerun()
 
-# Continue sidebar content (checkbox defined above, rest of content below)
-with st.sidebar:
+
+# Display Results
+if st.session_state.report:
+    render_results()
+
+@st.fragment
+def render_sidebar() -> None:
+    """Render the sidebar; refreshing the API status only reruns this fragment."""
+    api_keys = validate_api_keys()
     st.header("ℹ️ Acerca de")
     st.markdown("""
     Esta aplicación utiliza:
@@ -686,14 +705,25 @@ with st.sidebar:
         else:
             st.error("❌ OPENAI")
     else:
-        for api_name, available in api_keys.items():
-            status = "✅" if available else "❌"
-            st.markdown(f"{status} {api_name.upper()}")
+        st.markdown("\n\n".join(
+            f"{'✅' if available else '❌'} {api_name.upper()}"
+            for api_name, available in api_keys.items()
+        ))
     
     if (st.session_state.test_mode and api_keys.get('openai')) or (not st.session_state.test_mode and all(api_keys.values())):
         st.success("¡Todas las claves de API necesarias están configuradas!")
+
+    st.button(
+        "🔄 Actualizar estado de las API",
+        on_click=refresh_api_keys_status,
+        use_container_width=True
+    )
     
     st.markdown("---")
     st.caption("Generador de informes de visitas comerciales v1.0")
     st.caption("Creado con Streamlit, AssemblyAI y OpenAI")
 
+
+# Continue sidebar content (checkbox defined above, rest of content below)
+with st.sidebar:
+    render_sidebar()
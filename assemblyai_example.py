@@ -7,13 +7,37 @@ from audio files, including both Python SDK and direct API approaches.
 
 import os
 import time
+import asyncio
 import json
-from typing import Dict, List, Optional
+import gzip
+import logging
+import hashlib
+import functools
+import mmap
+import random
+import re
+from operator import itemgetter
+from concurrent.futures import ThreadPoolExecutor
+from types import MappingProxyType
+from typing import Dict, List, Mapping, Optional
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
+# Progress messages; silence with logging.getLogger("assemblyai_example").setLevel(logging.WARNING)
+log = logging.getLogger(__name__)
+
+# Read once at import; _require_api_key() reports a missing key when first needed
+ASSEMBLYAI_API_KEY = os.getenv("ASSEMBLYAI_API_KEY")
+
+
+def _require_api_key() -> str:
+    """Return the AssemblyAI API key or raise if it is not configured."""
+    if not ASSEMBLYAI_API_KEY:
+        raise ValueError("ASSEMBLYAI_API_KEY not found in environment variables")
+    return ASSEMBLYAI_API_KEY
+
 # ============================================================================
 # Approach 1: Using AssemblyAI Python SDK (Recommended)
 # ============================================================================
@@ -40,11 +64,7 @@ try:
             Dictionary containing transcription results with utterances
         """
         # Set API key
-        api_key = os.getenv("ASSEMBLYAI_API_KEY")
-        if not api_key:
-            raise ValueError("ASSEMBLYAI_API_KEY not found in environment variables")
-        
-        aai.settings.api_key = api_key
+        aai.settings.api_key = _require_api_key()
         
         # Configure transcription
         if speakers_expected:
@@ -104,7 +124,76 @@ except ImportError:
 # Approach 2: Using requests library (Direct API)
 # ============================================================================
 
+import atexit
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Transient failures (throttling, 5xx, dropped connections) are retried with
+# exponential backoff by the transport, for upload, create and poll alike.
+# raise_on_status=False hands the last response back so callers still see it.
+_RETRIES = Retry(
+    total=5,
+    backoff_factor=0.5,
+    status_forcelist=(429, 500, 502, 503, 504),
+    allowed_methods=frozenset(["GET", "POST"]),
+    respect_retry_after_header=True,
+    raise_on_status=False
+)
+
+# Shared session so the upload, the create request and every poll reuse pooled
+# keep-alive connections instead of opening a new TLS connection per call
+_SESSION = requests.Session()
+_SESSION.mount(
+    "https://",
+    HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=_RETRIES)
+)
+atexit.register(_SESSION.close)
+
+# Optional fast JSON backend for large transcript bodies
+try:
+    import orjson
+    _json_loads = orjson.loads
+    _json_dumps = orjson.dumps
+except ImportError:
+    _json_loads = json.loads
+    
+    def _json_dumps(obj) -> bytes:
+        return json.dumps(obj, ensure_ascii=False).encode("utf-8")
+
+# Matches a still-running job without parsing the body (quotes inside string
+# values are escaped, so transcript text cannot produce a false match)
+_PENDING_STATUS = re.compile(rb'"status"\s*:\s*"(?:queued|processing)"')
+
+# Fields kept from a completed transcript
+TRANSCRIPT_FIELDS = ("id", "status", "text", "language_code", "utterances")
+_get_transcript_fields = itemgetter(*TRANSCRIPT_FIELDS)
+
+# Cached results above this size are stored gzip-compressed
+CACHE_GZIP_THRESHOLD = 1 << 20  # 1 MiB
+
+# AssemblyAI REST endpoints
+BASE_URL = "https://api.assemblyai.com"
+UPLOAD_URL = f"{BASE_URL}/v2/upload"
+TRANSCRIPT_URL = f"{BASE_URL}/v2/transcript"
+
+
+@functools.lru_cache(maxsize=None)
+def _auth_headers(api_key: str) -> Mapping[str, str]:
+    """Build the (read-only) authorization header once per key."""
+    return MappingProxyType({"authorization": api_key})
+
+
+# Read size for hashing and streaming local files
+FILE_CHUNK_SIZE = 1 << 20  # 1 MiB
+
+
+def _iter_file_chunks(file_path: str, chunk_size: int = FILE_CHUNK_SIZE):
+    """Yield a file in fixed-size chunks without holding it all in memory."""
+    with open(file_path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            yield chunk
+
 
 def upload_audio_file(file_path: str, api_key: str) -> str:
     """
@@ -117,15 +206,22 @@ def upload_audio_file(file_path: str, api_key: str) -> str:
     Returns:
         Upload URL
     """
-    base_url = "https://api.assemblyai.com"
-    headers = {"authorization": api_key}
+    headers = _auth_headers(api_key)
     
     with open(file_path, "rb") as f:
-        response = requests.post(
-            f"{base_url}/v2/upload",
-            headers=headers,
-            data=f
-        )
+        if os.fstat(f.fileno()).st_size == 0:
+            response = _SESSION.post(UPLOAD_URL, headers=headers, data=b"")
+        else:
+            # Map the file and send it as one buffer: requests sets Content-Length
+            # from it and urllib3 hands it to sendall() straight from the page
+            # cache, with no read()/copy loop in Python
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped, \
+                    memoryview(mapped) as body:
+                response = _SESSION.post(
+                    UPLOAD_URL,
+                    headers=headers,
+                    data=body
+                )
     
     response.raise_for_status()
     return response.json()["upload_url"]
@@ -136,7 +232,12 @@ def create_transcript(
     api_key: str,
     min_speakers: int = 1,
     max_speakers: int = 10,
-    speakers_expected: Optional[int] = None
+    speakers_expected: Optional[int] = None,
+    webhook_url: Optional[str] = None,
+    webhook_auth_header_name: Optional[str] = None,
+    webhook_auth_header_value: Optional[str] = None,
+    diarize: bool = True,
+    language_code: Optional[str] = None
 ) -> str:
     """
     Create transcription request with speaker diarization.
@@ -147,81 +248,153 @@ def create_transcript(
         min_speakers: Minimum number of speakers expected
         max_speakers: Maximum number of speakers expected
         speakers_expected: Exact number of speakers (if known)
+        webhook_url: URL AssemblyAI POSTs to when the transcript is done
+        webhook_auth_header_name: Optional header AssemblyAI sends with the webhook
+        webhook_auth_header_value: Value for webhook_auth_header_name
+        diarize: Request speaker labels; False skips server-side diarization
+        language_code: Known language (e.g. "es"); skips automatic detection
     
     Returns:
         Transcript ID
     """
-    base_url = "https://api.assemblyai.com"
-    headers = {
-        "authorization": api_key,
-        "content-type": "application/json"
-    }
-    
-    # Build request payload
-    data = {
-        "audio_url": audio_url,
-        "speaker_labels": True
-    }
-    
-    if speakers_expected:
-        data["speakers_expected"] = speakers_expected
-    else:
-        data["speaker_options"] = {
-            "min_speakers_expected": min_speakers,
-            "max_speakers_expected": max_speakers
-        }
-    
-    # Submit transcription request
-    response = requests.post(
-        f"{base_url}/v2/transcript",
-        json=data,
-        headers=headers
+    # Submit transcription request (json= sets content-type: application/json)
+    response = _SESSION.post(
+        TRANSCRIPT_URL,
+        json=_transcript_request(
+            audio_url,
+            min_speakers,
+            max_speakers,
+            speakers_expected,
+            webhook_url,
+            webhook_auth_header_name,
+            webhook_auth_header_value,
+            diarize,
+            language_code
+        ),
+        headers=_auth_headers(api_key)
     )
     
     response.raise_for_status()
     return response.json()["id"]
 
 
+def _transcript_request(
+    audio_url: str,
+    min_speakers: int,
+    max_speakers: int,
+    speakers_expected: Optional[int],
+    webhook_url: Optional[str],
+    webhook_auth_header_name: Optional[str],
+    webhook_auth_header_value: Optional[str],
+    diarize: bool,
+    language_code: Optional[str]
+) -> Dict:
+    """Build the JSON body for a create-transcript request."""
+    data = {"audio_url": audio_url}
+    
+    # Diarization is a separate server-side stage; only request it when needed
+    if diarize:
+        data["speaker_labels"] = True
+        if speakers_expected:
+            data["speakers_expected"] = speakers_expected
+        else:
+            data["speaker_options"] = {
+                "min_speakers_expected": min_speakers,
+                "max_speakers_expected": max_speakers
+            }
+    
+    if language_code:
+        data["language_code"] = language_code
+    
+    if webhook_url:
+        data["webhook_url"] = webhook_url
+        if webhook_auth_header_name and webhook_auth_header_value:
+            data["webhook_auth_header_name"] = webhook_auth_header_name
+            data["webhook_auth_header_value"] = webhook_auth_header_value
+    
+    return data
+
+
 def poll_transcript(
     transcript_id: str,
     api_key: str,
-    poll_interval: int = 3,
+    poll_interval: float = 1.0,
+    max_poll_interval: float = 15.0,
+    max_wait_seconds: float = 600.0,
     max_attempts: int = 200
 ) -> Dict:
     """
     Poll transcript status until completion.
     
+    The wait between polls starts at poll_interval and doubles (with a little
+    jitter) up to max_poll_interval, so short jobs are picked up quickly and
+    long jobs are not polled at a fixed, wasteful cadence.
+    
     Args:
         transcript_id: Transcript ID from create_transcript
         api_key: AssemblyAI API key
-        poll_interval: Seconds to wait between polls
-        max_attempts: Maximum number of polling attempts
+        poll_interval: Seconds to wait before the second poll
+        max_poll_interval: Upper bound for the wait between polls
+        max_wait_seconds: Give up once this much time has passed
+        max_attempts: Safety cap on the number of polling requests
     
     Returns:
         Complete transcript result
+    
+    Raises:
+        ValueError: If max_attempts is less than 1
+        TimeoutError: If the transcript is not finished in time
     """
-    base_url = "https://api.assemblyai.com"
-    headers = {"authorization": api_key}
-    polling_endpoint = f"{base_url}/v2/transcript/{transcript_id}"
+    if max_attempts < 1:
+        raise ValueError("max_attempts must be at least 1")
     
-    attempts = 0
-    while attempts < max_attempts:
-        response = requests.get(polling_endpoint, headers=headers)
-        response.raise_for_status()
-        
-        result = response.json()
-        status = result.get("status")
+    headers = _auth_headers(api_key)
+    polling_endpoint = f"{TRANSCRIPT_URL}/{transcript_id}"
+    
+    started = time.monotonic()
+    deadline = started + max_wait_seconds
+    delay = poll_interval
+    for attempt in range(1, max_attempts + 1):
+        response = _SESSION.get(polling_endpoint, headers=headers)
         
-        if status == "completed":
-            return result
-        elif status == "error":
-            error_msg = result.get("error", "Unknown error")
-            raise RuntimeError(f"Transcription failed: {error_msg}")
+        if response.status_code == 429 or response.status_code >= 500:
+            # Throttled or transient server error: back off harder before retrying
+            delay = min(delay * 2, max_poll_interval)
+        else:
+            response.raise_for_status()
+            
+            result = _finished_transcript(response.content)
+            if result is not None:
+                return result
         
-        attempts += 1
-        time.sleep(poll_interval)
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        time.sleep(min(delay + random.uniform(0, 0.25), remaining))
+        delay = min(delay * 2, max_poll_interval)
     
-    raise TimeoutError(f"Transcription did not complete after {max_attempts} attempts")
+    raise TimeoutError(
+        f"Transcription did not complete after {attempt} polls "
+        f"({time.monotonic() - started:.0f}s)"
+    )
+
+
+def _finished_transcript(raw: bytes) -> Optional[Dict]:
+    """Return the parsed transcript once completed, None while still running."""
+    if _PENDING_STATUS.search(raw):
+        return None
+    
+    # Finished either way: parse the raw bytes once (orjson skips the str
+    # decode step)
+    result = _json_loads(raw)
+    status = result.get("status")
+    
+    if status == "completed":
+        return result
+    elif status == "error":
+        error_msg = result.get("error", "Unknown error")
+        raise RuntimeError(f"Transcription failed: {error_msg}")
+    return None
 
 
 def transcribe_with_api(
@@ -229,92 +402,389 @@ def transcribe_with_api(
     min_speakers: int = 1,
     max_speakers: int = 10,
     speakers_expected: Optional[int] = None,
-    is_url: bool = False
+    is_url: bool = False,
+    webhook_url: Optional[str] = None,
+    webhook_auth_header_name: Optional[str] = None,
+    webhook_auth_header_value: Optional[str] = None,
+    cache_dir: Optional[str] = None,
+    diarize: bool = True,
+    language_code: Optional[str] = None
 ) -> Dict:
     """
     Transcribe audio using direct API calls with speaker diarization.
     
+    With webhook_url set, no polling happens: the transcript is queued and
+    {"id": ..., "status": "queued"} is returned right away. AssemblyAI then
+    POSTs to the webhook when the job finishes; see handle_transcript_webhook().
+    
+    With cache_dir set (e.g. "./transcriptions"), completed results are stored
+    on disk keyed by the audio (URL or file hash) and speaker settings, and a
+    repeat call with the same inputs returns the stored result without
+    contacting AssemblyAI.
+    
     Args:
         audio_file_path: Path to local audio file or URL
         min_speakers: Minimum number of speakers expected
         max_speakers: Maximum number of speakers expected
         speakers_expected: Exact number of speakers (if known)
         is_url: If True, treat audio_file_path as URL (skip upload)
+        webhook_url: Optional URL to notify instead of polling
+        webhook_auth_header_name: Optional header AssemblyAI sends with the webhook
+        webhook_auth_header_value: Value for webhook_auth_header_name
+        cache_dir: Optional directory for cached results
+        diarize: Request speaker labels; False returns text without utterances
+        language_code: Known language (e.g. "es"); skips automatic detection
     
     Returns:
         Dictionary containing transcription results with utterances
     """
-    api_key = os.getenv("ASSEMBLYAI_API_KEY")
-    if not api_key:
-        raise ValueError("ASSEMBLYAI_API_KEY not found in environment variables")
+    api_key = _require_api_key()
+    
+    cache_path = None
+    if cache_dir and not webhook_url:
+        cache_path = _transcript_cache_path(
+            cache_dir,
+            audio_file_path,
+            is_url,
+            (min_speakers, max_speakers, speakers_expected, diarize, language_code)
+        )
+        cached = _load_cached_transcript(cache_path)
+        if cached is not None:
+            log.info("Using cached transcript: %s", cache_path)
+            return cached
     
     # Upload file if it's a local path
     if is_url:
         audio_url = audio_file_path
     else:
-        print("Uploading audio file...")
+        log.info("Uploading audio file...")
         audio_url = upload_audio_file(audio_file_path, api_key)
     
     # Create transcript
-    print("Creating transcript with speaker diarization...")
+    log.info("Creating transcript with speaker diarization...")
     transcript_id = create_transcript(
         audio_url,
         api_key,
         min_speakers,
         max_speakers,
-        speakers_expected
+        speakers_expected,
+        webhook_url,
+        webhook_auth_header_name,
+        webhook_auth_header_value,
+        diarize=diarize,
+        language_code=language_code
     )
     
-    print(f"Transcript ID: {transcript_id}")
-    print("Polling for results...")
+    log.info("Transcript ID: %s", transcript_id)
+    if webhook_url:
+        # The webhook announces completion; nothing to wait for here
+        return {"id": transcript_id, "status": "queued"}
+    
+    log.info("Polling for results...")
     
     # Poll for results
     result = poll_transcript(transcript_id, api_key)
+    summary = _summarize_transcript(result)
+    if cache_path:
+        _store_cached_transcript(cache_path, summary)
+    return summary
+
+
+def _transcript_cache_path(
+    cache_dir: str,
+    audio_file_path: str,
+    is_url: bool,
+    params: tuple
+) -> str:
+    """Build the cache file path for an audio source and its speaker settings."""
+    if is_url:
+        source = audio_file_path
+    else:
+        digest = hashlib.sha256()
+        for chunk in _iter_file_chunks(audio_file_path):
+            digest.update(chunk)
+        source = digest.hexdigest()
+    
+    key = hashlib.sha256(f"{source}|{json.dumps(params)}".encode("utf-8")).hexdigest()
+    return os.path.join(cache_dir, f"{key}.json")
+
+
+def _load_cached_transcript(cache_path: str) -> Optional[Dict]:
+    """Return a cached result (plain or gzipped), or None on a miss."""
+    for path, opener in ((cache_path, open), (cache_path + ".gz", gzip.open)):
+        if os.path.exists(path):
+            with opener(path, "rb") as f:
+                return _json_loads(f.read())
+    return None
+
+
+def _store_cached_transcript(cache_path: str, summary: Dict) -> None:
+    """Write a result to the cache, gzipping large ones."""
+    os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+    data = _json_dumps(summary)
+    if len(data) > CACHE_GZIP_THRESHOLD:
+        with gzip.open(cache_path + ".gz", "wb") as f:
+            f.write(data)
+    else:
+        with open(cache_path, "wb") as f:
+            f.write(data)
+
+
+def handle_transcript_webhook(payload: Dict) -> Dict:
+    """
+    Fetch the finished transcript announced by an AssemblyAI webhook.
+    
+    Call this from the route that receives webhook_url requests, with the JSON
+    body AssemblyAI sends ({"transcript_id": ..., "status": ...}). For example,
+    in Flask: return handle_transcript_webhook(request.get_json()). The job
+    has already finished, so the poll returns on its first request.
+    
+    Args:
+        payload: Webhook request body
+    
+    Returns:
+        Dictionary containing transcription results with utterances
+    """
+    if payload.get("status") == "error":
+        raise RuntimeError(f"Transcription failed: {payload.get('transcript_id')}")
+    
+    api_key = _require_api_key()
+    
+    result = poll_transcript(payload["transcript_id"], api_key)
+    return _summarize_transcript(result)
+
+
+def _summarize_transcript(result: Dict) -> Dict:
+    """Keep the fields this example works with from a completed transcript."""
+    # The transcript endpoint always returns these keys (null when unset)
+    summary = dict(zip(TRANSCRIPT_FIELDS, _get_transcript_fields(result)))
+    summary["utterances"] = summary["utterances"] or []
+    return summary
+
+
+def transcribe_many(paths: List[str], max_workers: int = 8, **kwargs) -> List[Dict]:
+    """
+    Transcribe several audio files concurrently via the direct API.
+    
+    Each job mostly waits on the network (upload and polling), so threads
+    overlap that idle time. The shared session's pool (pool_maxsize=16) is
+    larger than max_workers, so workers never wait for a connection.
     
-    # Format and return
-    return {
-        "id": result.get("id"),
-        "status": result.get("status"),
-        "text": result.get("text"),
-        "language_code": result.get("language_code"),
-        "utterances": result.get("utterances", [])
-    }
+    Args:
+        paths: Local audio file paths or URLs
+        max_workers: Maximum number of transcriptions in flight
+        **kwargs: Passed through to transcribe_with_api()
+    
+    Returns:
+        Transcription results, in the same order as paths
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(lambda path: transcribe_with_api(path, **kwargs), paths))
+
+
+# ============================================================================
+# Approach 3: Async direct API (httpx)
+# ============================================================================
+
+# httpx ships as a dependency of the openai SDK
+try:
+    import httpx
+    HTTPX_AVAILABLE = True
+except ImportError:
+    HTTPX_AVAILABLE = False
+
+
+async def _aiter_file_chunks(file_path: str, chunk_size: int = FILE_CHUNK_SIZE):
+    """Yield a file in chunks, reading off the event loop thread."""
+    with open(file_path, "rb") as f:
+        while chunk := await asyncio.to_thread(f.read, chunk_size):
+            yield chunk
+
+
+async def transcribe_with_api_async(
+    client: "httpx.AsyncClient",
+    audio_file_path: str,
+    min_speakers: int = 1,
+    max_speakers: int = 10,
+    speakers_expected: Optional[int] = None,
+    is_url: bool = False,
+    diarize: bool = True,
+    language_code: Optional[str] = None,
+    poll_interval: float = 1.0,
+    max_poll_interval: float = 15.0,
+    max_wait_seconds: float = 600.0
+) -> Dict:
+    """
+    Async counterpart of transcribe_with_api: upload, create and poll as one coroutine.
+    
+    Waiting between polls is an asyncio.sleep, so a single event loop can
+    supervise many transcriptions without a thread each. See
+    transcribe_many_async() for the batch entry point.
+    
+    Args:
+        client: Shared httpx.AsyncClient
+        audio_file_path: Path to local audio file or URL
+        min_speakers: Minimum number of speakers expected
+        max_speakers: Maximum number of speakers expected
+        speakers_expected: Exact number of speakers (if known)
+        is_url: If True, treat audio_file_path as URL (skip upload)
+        diarize: Request speaker labels
+        language_code: Known language (e.g. "es"); skips automatic detection
+        poll_interval: Seconds to wait before the second poll
+        max_poll_interval: Upper bound for the wait between polls
+        max_wait_seconds: Give up once this much time has passed
+    
+    Returns:
+        Dictionary containing transcription results with utterances
+    """
+    headers = _auth_headers(_require_api_key())
+    
+    if is_url:
+        audio_url = audio_file_path
+    else:
+        response = await client.post(
+            UPLOAD_URL,
+            headers=headers,
+            content=_aiter_file_chunks(audio_file_path)
+        )
+        response.raise_for_status()
+        audio_url = _json_loads(response.content)["upload_url"]
+    
+    response = await client.post(
+        TRANSCRIPT_URL,
+        headers=headers,
+        json=_transcript_request(
+            audio_url,
+            min_speakers,
+            max_speakers,
+            speakers_expected,
+            None,
+            None,
+            None,
+            diarize,
+            language_code
+        )
+    )
+    response.raise_for_status()
+    transcript_id = _json_loads(response.content)["id"]
+    log.info("Transcript ID: %s", transcript_id)
+    
+    polling_endpoint = f"{TRANSCRIPT_URL}/{transcript_id}"
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + max_wait_seconds
+    delay = poll_interval
+    while True:
+        response = await client.get(polling_endpoint, headers=headers)
+        if response.status_code != 429 and response.status_code < 500:
+            response.raise_for_status()
+            result = _finished_transcript(response.content)
+            if result is not None:
+                return _summarize_transcript(result)
+        
+        remaining = deadline - loop.time()
+        if remaining <= 0:
+            raise TimeoutError(f"Transcription did not complete within {max_wait_seconds:.0f}s")
+        await asyncio.sleep(min(delay + random.uniform(0, 0.25), remaining))
+        delay = min(delay * 2, max_poll_interval)
+
+
+async def transcribe_many_async(paths: List[str], max_connections: int = 8, **kwargs) -> List[Dict]:
+    """
+    Transcribe several audio files concurrently on one event loop.
+    
+    Args:
+        paths: Local audio file paths or URLs
+        max_connections: Connection limit for the shared client
+        **kwargs: Passed through to transcribe_with_api_async()
+    
+    Returns:
+        Transcription results, in the same order as paths
+    """
+    if not HTTPX_AVAILABLE:
+        raise ImportError("httpx not installed. Install with: pip install httpx")
+    
+    limits = httpx.Limits(max_connections=max_connections)
+    # Connection failures are retried by the transport; 429/5xx by the poll loop
+    transport = httpx.AsyncHTTPTransport(retries=3, limits=limits)
+    async with httpx.AsyncClient(transport=transport, timeout=httpx.Timeout(30.0, write=None)) as client:
+        return await asyncio.gather(*(
+            transcribe_with_api_async(client, path, **kwargs) for path in paths
+        ))
 
 
 # ============================================================================
 # Example Usage
 # ============================================================================
 
+# Optional columnar view of utterances for analytics (talk time, confidence, ...)
+try:
+    import pandas as pd
+    PANDAS_AVAILABLE = True
+except ImportError:
+    PANDAS_AVAILABLE = False
+
+UTTERANCE_COLUMNS = ("start", "end", "confidence", "speaker", "text")
+
+
+def utterances_to_frame(utterances: List[Dict]):
+    """
+    Convert utterances to a pandas DataFrame for vectorized analysis.
+    
+    Adds start_sec/end_sec columns and stores speaker as a categorical, e.g.
+    frame.groupby("speaker").eval("end_sec - start_sec") for talk time.
+    
+    Args:
+        utterances: List of utterance dictionaries
+    
+    Returns:
+        DataFrame with one row per utterance
+    """
+    if not PANDAS_AVAILABLE:
+        raise ImportError("pandas not installed. Install with: pip install pandas")
+    
+    frame = pd.DataFrame.from_records(utterances, columns=UTTERANCE_COLUMNS)
+    frame["start_sec"] = frame["start"].to_numpy() / 1000
+    frame["end_sec"] = frame["end"].to_numpy() / 1000
+    frame["speaker"] = frame["speaker"].astype("category")
+    return frame
+
+
+UTTERANCE_DISPLAY_FORMAT = (
+    "[{start:.1f}s - {end:.1f}s] Speaker {speaker} (confidence: {confidence:.2f}):\n{text}\n"
+).format
+
+
 def format_utterances_for_display(utterances: List[Dict]) -> str:
     """
     Format utterances for readable display.
     
     Args:
-        utterances: List of utterance dictionaries
+        utterances: List of utterance dictionaries (as returned by
+            transcribe_with_sdk or transcribe_with_api), or a DataFrame
+            from utterances_to_frame()
     
     Returns:
         Formatted string
     """
-    output = []
-    for utterance in utterances:
-        speaker = utterance.get("speaker", "Unknown")
-        text = utterance.get("text", "")
-        start_ms = utterance.get("start", 0)
-        end_ms = utterance.get("end", 0)
-        confidence = utterance.get("confidence", 0)
-        
-        start_sec = start_ms / 1000
-        end_sec = end_ms / 1000
-        
-        output.append(
-            f"[{start_sec:.1f}s - {end_sec:.1f}s] Speaker {speaker} "
-            f"(confidence: {confidence:.2f}):\n{text}\n"
-        )
+    if PANDAS_AVAILABLE and isinstance(utterances, pd.DataFrame):
+        utterances = utterances[list(UTTERANCE_COLUMNS)].to_dict("records")
     
-    return "\n".join(output)
+    # Missing or null fields fall back to neutral defaults instead of failing
+    return "\n".join([
+        UTTERANCE_DISPLAY_FORMAT(
+            start=(u.get("start") or 0) / 1000,
+            end=(u.get("end") or 0) / 1000,
+            speaker=u.get("speaker") or "Unknown",
+            confidence=u.get("confidence") or 0,
+            text=u.get("text") or ""
+        )
+        for u in utterances
+    ])
 
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    
     # Example: Using Python SDK
     if transcribe_with_sdk:
         print("=" * 60)
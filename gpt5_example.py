@@ -13,6 +13,16 @@ from dotenv import load_dotenv
 # Load environment variables
 load_dotenv()
 
+# Default stored prompt for generate_real_estate_report, read once at import
+OPENAI_PROMPT_ID = os.getenv("OPENAI_PROMPT_ID")
+
+# Optional fast JSON backend for serializing large transcriptions
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
 try:
     from openai import OpenAI, APIError
     
@@ -146,15 +156,21 @@ def conversation_with_roles(user_message: str, system_instruction: str) -> str:
 def generate_real_estate_report(
     transcription_data: Dict,
     prompt_id: Optional[str] = None,
-    prompt_version: str = "1"
+    prompt_version: str = "1",
+    include_words: bool = False
 ) -> str:
     """
     Generate a real estate visit report from diarized transcription using stored prompt.
     
+    The transcription is sent as compact JSON; indentation only adds input
+    tokens. Per-word timings are dropped unless include_words is set, since
+    the report works from utterances.
+    
     Args:
         transcription_data: Transcription JSON with utterances
         prompt_id: OpenAI stored prompt ID (defaults to env variable)
         prompt_version: Prompt version (default: "1")
+        include_words: Keep each utterance's "words" list in the input
         
     Returns:
         Markdown report
@@ -164,14 +180,28 @@ def generate_real_estate_report(
     
     # Get prompt ID from parameter or environment
     if not prompt_id:
-        prompt_id = os.getenv("OPENAI_PROMPT_ID")
+        prompt_id = OPENAI_PROMPT_ID
     
     if not prompt_id:
         raise ValueError("OPENAI_PROMPT_ID not found. Either pass as parameter or set in environment.")
     
+    if not include_words and transcription_data.get("utterances"):
+        transcription_data = {
+            **transcription_data,
+            "utterances": [
+                {key: value for key, value in utterance.items() if key != "words"}
+                for utterance in transcription_data["utterances"]
+            ]
+        }
+    
+    if ORJSON_AVAILABLE:
+        payload = orjson.dumps(transcription_data, option=orjson.OPT_NON_STR_KEYS).decode("utf-8")
+    else:
+        payload = json.dumps(transcription_data, ensure_ascii=False, separators=(",", ":"))
+    
     # Format input
     input_text = f"""TRANSCRIPTION DATA:
-{json.dumps(transcription_data, indent=2, ensure_ascii=False)}
+{payload}
 """
     
     # Generate report using stored prompt
@@ -345,9 +375,15 @@ def safe_generate(prompt: str, max_retries: int = 3) -> Optional[str]:
     """
     Generate response with error handling and retries.
     
+    Rate limits (429), server errors and connection failures are retried by
+    the OpenAI client itself, with exponential backoff that honours
+    Retry-After; only the final failure reaches this function.
+    
     Args:
         prompt: Input prompt
-        max_retries: Maximum number of retry attempts
+        max_retries: Retries after the first attempt for rate limits, server
+            errors and connection failures, so up to max_retries + 1 calls;
+            other errors are not retried
         
     Returns:
         Generated text or None if failed
@@ -355,37 +391,32 @@ def safe_generate(prompt: str, max_retries: int = 3) -> Optional[str]:
     if not client:
         raise ImportError("OpenAI client not initialized")
     
-    for attempt in range(max_retries):
-        try:
-            response = client.responses.create(
-                model="gpt-5",
-                reasoning={"effort": "medium"},
-                input=prompt,
-                max_output_tokens=4000
-            )
-            
-            # Check for incomplete response
-            if hasattr(response, 'status') and response.status == "incomplete":
-                print(f"Warning: Response incomplete ({response.incomplete_details.reason})")
-                return response.output_text or None
-            
-            return response.output_text
-            
-        except APIError as e:
-            print(f"API Error (attempt {attempt + 1}/{max_retries}): {e.message}")
-            if e.status_code == 429:  # Rate limit
-                import time
-                time.sleep(2 ** attempt)  # Exponential backoff
-            elif e.status_code >= 500:  # Server error
-                import time
-                time.sleep(2 ** attempt)
-            else:
-                return None
-        except Exception as e:
-            print(f"Unexpected error: {e}")
-            return None
-    
-    return None
+    try:
+        response = client.with_options(max_retries=max_retries).responses.create(
+            model="gpt-5",
+            reasoning={"effort": "medium"},
+            input=prompt,
+            max_output_tokens=4000
+        )
+        
+        # Check for incomplete response
+        if hasattr(response, 'status') and response.status == "incomplete":
+            print(f"Warning: Response incomplete ({response.incomplete_details.reason})")
+            return response.output_text or None
+        
+        return response.output_text
+        
+    except APIError as e:
+        # Only 429, 5xx and connection failures (no status code) were retried
+        status_code = getattr(e, "status_code", None)
+        if status_code is None or status_code == 429 or status_code >= 500:
+            print(f"API Error (after {max_retries} retries): {e.message}")
+        else:
+            print(f"API Error: {e.message}")
+        return None
+    except Exception as e:
+        print(f"Unexpected error: {e}")
+        return None
 
 
 # ============================================================================
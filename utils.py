@@ -8,14 +8,27 @@ Este módulo proporciona funciones para:
 """
 
 import os
+import sys
 import json
-from datetime import datetime
-from typing import Dict, Optional
+import time
+import logging
+import random
+import asyncio
+import hashlib
+import functools
+import itertools
+import importlib
+import importlib.util
+from dataclasses import asdict, dataclass
+from typing import BinaryIO, Callable, Dict, Iterator, Optional, Union
 from dotenv import load_dotenv
 
 # Load environment variables from .env when present
 load_dotenv()
 
+# Diagnostics go through logging; enable them with logging.getLogger("utils").setLevel(logging.DEBUG)
+logger = logging.getLogger(__name__)
+
 # Optional Streamlit import (only available when running the app)
 try:
     import streamlit as st
@@ -25,6 +38,42 @@ except ImportError:
     st = None  # type: ignore[assignment]
 
 
+@dataclass(slots=True)
+class Utterance:
+    """A single speaker turn of a diarized transcription."""
+    speaker: str
+    text: str
+    start: int = 0
+    end: int = 0
+    confidence: Optional[float] = None
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "Utterance":
+        """Build an utterance from its JSON representation."""
+        return cls(
+            speaker=data.get('speaker', 'Desconocido'),
+            text=data.get('text') or '',
+            start=data.get('start', 0),
+            end=data.get('end', 0),
+            confidence=data.get('confidence'),
+        )
+
+
+def _utterance_counts(utterances) -> Dict:
+    """Count utterances and distinct speakers once so callers can read them from the metadata."""
+    return {
+        "num_utterances": len(utterances),
+        "num_speakers": len({u.speaker for u in utterances}),
+    }
+
+
+def _json_default(obj):
+    """json.dump hook that serializes Utterance instances as plain dicts."""
+    if isinstance(obj, Utterance):
+        return asdict(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
 def _get_secret_value(key: str, default: Optional[str] = None) -> Optional[str]:
     """
     Retrieve configuration values from environment variables or Streamlit secrets.
@@ -46,6 +95,10 @@ def _get_secret_value(key: str, default: Optional[str] = None) -> Optional[str]:
         except (AttributeError, RuntimeError):
             secrets = None
 
+        # Without a secrets.toml any lookup would raise and print an st.error
+        if secrets is not None and not secrets.load_if_toml_exists():
+            secrets = None
+
         if secrets is not None:
             # Support both top-level keys and section-based keys (e.g. openai.api_key)
             if key in secrets:
@@ -64,54 +117,223 @@ def _get_secret_value(key: str, default: Optional[str] = None) -> Optional[str]:
     return default
 
 
-# Import API clients
+# API client SDKs are heavy to import, so only check that they are installed here;
+# they are loaded on first use by _load_sdk() (test mode never touches AssemblyAI)
+ASSEMBLYAI_AVAILABLE = importlib.util.find_spec("assemblyai") is not None
+if not ASSEMBLYAI_AVAILABLE:
+    print("Aviso: SDK de AssemblyAI no instalado")
+
+OPENAI_AVAILABLE = importlib.util.find_spec("openai") is not None
+if not OPENAI_AVAILABLE:
+    print("Aviso: SDK de OpenAI no instalado")
+
+
+@functools.lru_cache(maxsize=None)
+def _load_sdk(module_name: str):
+    """Import an API client SDK the first time it is needed and reuse it afterwards."""
+    return importlib.import_module(module_name)
+
+
+# Waits (seconds) before each retry of a transient API failure
+RETRY_DELAYS = (1, 5, 15)
+
+
+def _get_transcriber(api_key: str):
+    """Build an AssemblyAI transcriber for the given key (cached per key under Streamlit)."""
+    aai = _load_sdk("assemblyai")
+    aai.settings.api_key = api_key
+    return aai.Transcriber()
+
+
+def _get_openai_client(api_key: str):
+    """Build an OpenAI client for the given key (cached per key under Streamlit)."""
+    # The client retries rate limits, 5xx and connection errors itself, with
+    # exponential backoff that honours Retry-After
+    return _load_sdk("openai").OpenAI(api_key=api_key, max_retries=len(RETRY_DELAYS))
+
+
+def _is_transient_error(exc: Exception) -> bool:
+    """True for rate limiting, server errors and network failures."""
+    status_code = getattr(exc, "status_code", None)
+    if status_code is not None:
+        return status_code == 429 or status_code >= 500
+    # Both SDKs talk HTTP through httpx; it is only imported once an SDK is loaded
+    httpx = sys.modules.get("httpx")
+    return isinstance(exc, (ConnectionError, TimeoutError)) or (
+        httpx is not None and isinstance(exc, httpx.TransportError)
+    )
+
+
+def _call_with_retries(func: Callable, *args, before_retry: Optional[Callable] = None):
+    """Call func, retrying transient failures after RETRY_DELAYS (with jitter)."""
+    for delay in RETRY_DELAYS:
+        try:
+            return func(*args)
+        except Exception as e:
+            if not _is_transient_error(e):
+                raise
+            logger.warning("Transient API error, retrying in ~%ss: %s", delay, e)
+            time.sleep(delay + random.uniform(0, delay / 2))
+            if before_retry is not None:
+                before_retry()
+    return func(*args)
+
+
+if STREAMLIT_AVAILABLE and st.runtime.exists():
+    # Reuse one client per key across reruns and sessions, keeping their HTTP
+    # connection pools (and the transcriber's worker pool) warm between requests
+    _get_transcriber = st.cache_resource(show_spinner=False)(_get_transcriber)
+    _get_openai_client = st.cache_resource(show_spinner=False)(_get_openai_client)
+else:
+    # Scripts and workers outside Streamlit get the same per-key reuse
+    _get_transcriber = functools.lru_cache(maxsize=None)(_get_transcriber)
+    _get_openai_client = functools.lru_cache(maxsize=None)(_get_openai_client)
+
+# Optional fast JSON backend (falls back to the standard library)
 try:
-    import assemblyai as aai
-    ASSEMBLYAI_AVAILABLE = True
+    import orjson
+    ORJSON_AVAILABLE = True
 except ImportError:
-    ASSEMBLYAI_AVAILABLE = False
-    print("Aviso: SDK de AssemblyAI no instalado")
+    ORJSON_AVAILABLE = False
 
+# Optional incremental JSON parser for large transcription uploads
 try:
-    from openai import OpenAI
-    OPENAI_AVAILABLE = True
+    import ijson
+    IJSON_AVAILABLE = True
+    JSON_ERRORS = (json.JSONDecodeError, ijson.JSONError)
 except ImportError:
-    OPENAI_AVAILABLE = False
-    print("Aviso: SDK de OpenAI no instalado")
+    IJSON_AVAILABLE = False
+    JSON_ERRORS = (json.JSONDecodeError,)
+
+# Uploads above this size are parsed incrementally when ijson is available
+STREAMING_JSON_THRESHOLD = 1024 * 1024
+
+# Optional zstd compression for saved transcriptions
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+    ZSTD_ERRORS = (zstandard.ZstdError,)
+except ImportError:
+    ZSTD_AVAILABLE = False
+    ZSTD_ERRORS = ()
+
+# Frame magic number that identifies zstd-compressed uploads
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+# Save transcriptions as .json.zst (level 3) when enabled and zstandard is installed
+COMPRESS_TRANSCRIPTIONS = ZSTD_AVAILABLE and os.getenv("COMPRESS_TRANSCRIPTIONS", "false").lower() == "true"
+
 
 
-def transcribe_audio(audio_file_path: str) -> Dict:
+def parse_json_bytes(raw: bytes) -> Dict:
     """
-    Transcribe audio file using AssemblyAI with speaker diarization.
+    Decode a JSON document, using orjson when it is installed.
     
     Args:
-        audio_file_path: Path to the audio file (MP3)
+        raw: Raw JSON bytes (e.g. the contents of an uploaded file)
         
     Returns:
-        Dictionary containing:
-            - formatted_conversation: Simple string format "Speaker A: text\\nSpeaker B: text..."
-            - full_transcript: Complete transcript text
-            - utterances: List of utterance dictionaries
-            - metadata: Additional info (language, duration, etc.)
-            
+        Decoded JSON data
+        
     Raises:
-        ValueError: If API key is missing or SDK not available
-        Exception: If transcription fails
+        json.JSONDecodeError: If the document is not valid JSON
     """
+    if ORJSON_AVAILABLE:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+
+def _stream_transcription_json(file_obj: BinaryIO) -> Dict:
+    """
+    Parse a transcription JSON in one incremental pass with ijson.
+    
+    Each utterance is turned into an Utterance as soon as its object closes,
+    so the generic list of utterance dicts is never materialized. Keys other
+    than utterances, full_transcript and metadata are skipped.
+    """
+    utterances = []
+    data = {"utterances": utterances}
+    builder = target = None
+    for prefix, event, value in ijson.parse(file_obj, use_float=True):
+        if builder is None:
+            if prefix == "full_transcript" and event == "string":
+                data["full_transcript"] = value
+                continue
+            if event != "start_map" or prefix not in ("utterances.item", "metadata"):
+                continue
+            builder, target = ijson.ObjectBuilder(), prefix
+        
+        builder.event(event, value)
+        if event == "end_map" and prefix == target:
+            if target == "metadata":
+                data["metadata"] = builder.value
+            else:
+                utterances.append(Utterance.from_dict(builder.value))
+            builder = target = None
+    return data
+
+
+def read_transcription_json(file_obj: BinaryIO, size: int) -> Dict:
+    """
+    Read a transcription JSON file (test mode).
+    
+    Large files are parsed incrementally with ijson, building Utterance
+    objects one at a time; smaller files are decoded in one go with
+    parse_json_bytes(). zstd-compressed files (.json.zst, see
+    save_transcription()) are decompressed on the fly.
+    
+    Args:
+        file_obj: Binary file-like object with the JSON document
+        size: Size of the document in bytes
+        
+    Returns:
+        Dictionary suitable for load_transcription_from_json()
+        
+    Raises:
+        ValueError: If the document is not valid JSON or not valid zstd data
+    """
+    file_obj.seek(0)
+    if file_obj.read(4) == ZSTD_MAGIC:
+        if not ZSTD_AVAILABLE:
+            raise ValueError("Archivo comprimido con zstd: instala zstandard con: pip install zstandard")
+        file_obj.seek(0)
+        file_obj = zstandard.ZstdDecompressor().stream_reader(file_obj)
+        # The decompressed size is unknown up front; assume it is large
+        size = STREAMING_JSON_THRESHOLD + 1
+    else:
+        file_obj.seek(0)
+    
+    try:
+        if IJSON_AVAILABLE and size > STREAMING_JSON_THRESHOLD:
+            return _stream_transcription_json(file_obj)
+        return parse_json_bytes(file_obj.read())
+    except JSON_ERRORS as e:
+        raise ValueError(f"Archivo JSON no válido: {e}")
+    except ZSTD_ERRORS as e:
+        # Corrupt or truncated .zst upload
+        raise ValueError(f"Archivo comprimido no válido: {e}") from e
+
+
+def _require_assemblyai():
+    """Load the AssemblyAI SDK and return it with the configured API key."""
     if not ASSEMBLYAI_AVAILABLE:
         raise ImportError("SDK de AssemblyAI no instalado. Instálalo con: pip install assemblyai")
+    aai = _load_sdk("assemblyai")
     
     # Get API key
     api_key = _get_secret_value("ASSEMBLYAI_API_KEY")
     if not api_key:
         raise ValueError("ASSEMBLYAI_API_KEY no está configurado en las variables de entorno ni en los secretos de Streamlit")
     
-    # Configure API
+    # Transcript lookups read the key from the SDK's global settings
     aai.settings.api_key = api_key
-    
-    # Configure transcription with speaker diarization
+    return aai, api_key
+
+
+def _transcription_config(aai, **webhook_options):
+    """Diarization and language-detection settings shared by every transcription."""
     # Use automatic language detection with Catalan and Spanish as expected languages
-    config = aai.TranscriptionConfig(
+    return aai.TranscriptionConfig(
         speaker_labels=True,
         language_detection=True,  # Enable automatic language detection
         language_detection_options=aai.LanguageDetectionOptions(
@@ -121,54 +343,196 @@ def transcribe_audio(audio_file_path: str) -> Dict:
         speaker_options=aai.SpeakerOptions(
             min_speakers_expected=2,
             max_speakers_expected=5
-        )
+        ),
+        **webhook_options
     )
+
+
+@functools.lru_cache(maxsize=1)
+def _default_transcription_config():
+    """The (webhook-free) transcription config, built once."""
+    return _transcription_config(_load_sdk("assemblyai"))
+
+
+def _check_audio_source(audio_source: Union[str, BinaryIO]) -> None:
+    """Verify the audio exists, rewind streams and log the size before sending it."""
+    if isinstance(audio_source, (str, os.PathLike)):
+        # A single stat both checks that the file exists and gives its size
+        try:
+            file_size = os.stat(audio_source).st_size
+        except FileNotFoundError:
+            raise FileNotFoundError(f"Archivo de audio no encontrado: {audio_source}") from None
+        source_name = audio_source
+    elif logger.isEnabledFor(logging.DEBUG):
+        # Measure the in-memory stream and rewind it for the upload
+        audio_source.seek(0, os.SEEK_END)
+        file_size = audio_source.tell()
+        audio_source.seek(0)
+        source_name = getattr(audio_source, 'name', '<stream>')
+    else:
+        # Only the rewind is needed when nobody reads the size
+        audio_source.seek(0)
+        return
+    
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Sending file to AssemblyAI: %s", source_name)
+        logger.debug("File size: %s bytes (%.2f MB)", file_size, file_size / 1048576)
+
+
+def _rewind(audio_source: Union[str, BinaryIO]) -> Optional[Callable]:
+    """Return a callback that rewinds a stream source before it is re-sent."""
+    if isinstance(audio_source, (str, os.PathLike)):
+        return None
+    return lambda: audio_source.seek(0)
+
+
+def transcribe_audio(audio_source: Union[str, BinaryIO]) -> Dict:
+    """
+    Transcribe audio file using AssemblyAI with speaker diarization.
     
-    # Verify the file before sending
-    if not os.path.exists(audio_file_path):
-        raise FileNotFoundError(f"Archivo de audio no encontrado: {audio_file_path}")
+    Blocks until the transcription finishes. To return immediately and be
+    notified by webhook instead, use submit_transcription() and
+    fetch_transcription().
     
-    file_size = os.path.getsize(audio_file_path)
-    print(f"DEBUG: Sending file to AssemblyAI: {audio_file_path}")
-    print(f"DEBUG: File size: {file_size} bytes ({file_size/1024/1024:.2f} MB)")
+    Args:
+        audio_source: Path to the audio file (MP3) or a binary file-like object
+            with its contents (e.g. a Streamlit UploadedFile), which is
+            uploaded directly without going through a temporary file
+        
+    Returns:
+        Dictionary containing:
+            - formatted_conversation: Simple string format "Speaker A: text\\nSpeaker B: text..."
+            - full_transcript: Complete transcript text
+            - utterances: List of Utterance objects
+            - metadata: Additional info (language, duration, num_utterances, num_speakers, etc.)
+            
+    Raises:
+        ValueError: If API key is missing or SDK not available
+        Exception: If transcription fails
+    """
+    aai, api_key = _require_assemblyai()
+    _check_audio_source(audio_source)
     
-    # Create transcriber and transcribe
-    transcriber = aai.Transcriber()
-    transcript = transcriber.transcribe(audio_file_path, config)
+    transcript_id = _create_transcript(api_key, audio_source, _default_transcription_config())
     
-    # Debug: Print transcription details
-    print(f"DEBUG: Transcription ID: {transcript.id}")
-    print(f"DEBUG: Status: {transcript.status}")
+    # Only the wait is retried once the job exists, so a failure never queues
+    # (and bills) the same audio twice
+    return _transcription_result(_call_with_retries(aai.Transcript.get_by_id, transcript_id))
+
+
+def _create_transcript(api_key: str, audio_source: Union[str, BinaryIO], config) -> str:
+    """Upload the audio, create its transcription job and return the job ID."""
+    transcriber = _get_transcriber(api_key)
     
-    # Get language detection info
-    language_detected = getattr(transcript, 'language_code', 'unknown')
-    language_confidence = getattr(transcript, 'language_confidence', 'N/A')
+    # Each step is retried on its own: a failed creation reuses the upload
+    upload_url = _call_with_retries(
+        transcriber.upload_file,
+        audio_source,
+        before_retry=_rewind(audio_source)
+    )
+    transcript = _call_with_retries(transcriber.submit, upload_url, config)
+    return transcript.id
+
+
+def submit_transcription(audio_source: Union[str, BinaryIO]) -> str:
+    """
+    Queue an audio file for transcription and return without waiting.
     
-    print(f"DEBUG: Language detected: {language_detected}")
-    print(f"DEBUG: Language confidence: {language_confidence}")
+    When ASSEMBLYAI_WEBHOOK_URL is configured (environment or Streamlit
+    secrets), AssemblyAI POSTs {"transcript_id": ..., "status": ...} to it once
+    the job finishes; ASSEMBLYAI_WEBHOOK_AUTH_HEADER_NAME/_VALUE optionally
+    add an auth header to that request. The webhook handler then calls
+    fetch_transcription() with the ID.
     
-    if transcript.utterances:
-        print(f"DEBUG: First utterance: Speaker {transcript.utterances[0].speaker}: {transcript.utterances[0].text[:100]}...")
+    Args:
+        audio_source: Path to the audio file or a binary file-like object
+        
+    Returns:
+        AssemblyAI transcript ID
+    """
+    aai, api_key = _require_assemblyai()
+    _check_audio_source(audio_source)
+    
+    webhook_options = {}
+    webhook_url = _get_secret_value("ASSEMBLYAI_WEBHOOK_URL")
+    if webhook_url:
+        webhook_options["webhook_url"] = webhook_url
+        header_name = _get_secret_value("ASSEMBLYAI_WEBHOOK_AUTH_HEADER_NAME")
+        header_value = _get_secret_value("ASSEMBLYAI_WEBHOOK_AUTH_HEADER_VALUE")
+        if header_name and header_value:
+            webhook_options["webhook_auth_header_name"] = header_name
+            webhook_options["webhook_auth_header_value"] = header_value
+    
+    transcript_id = _create_transcript(
+        api_key, audio_source, _transcription_config(aai, **webhook_options)
+    )
+    logger.debug("Submitted transcription: %s", transcript_id)
+    return transcript_id
+
+
+def fetch_transcription(transcript_id: str) -> Dict:
+    """
+    Fetch a finished transcription by ID (e.g. from a webhook handler).
+    
+    The transcript is read with a single request, without waiting: a job
+    that is still queued or processing raises instead of blocking.
     
-    # Check for errors
+    Args:
+        transcript_id: ID returned by submit_transcription()
+        
+    Returns:
+        Same structure as transcribe_audio()
+        
+    Raises:
+        ValueError: If API key is missing or SDK not available
+        Exception: If the transcription failed or has not finished yet
+    """
+    aai, _ = _require_assemblyai()
+    # One GET of the transcript; Transcript.get_by_id() would poll until it finishes
+    client = aai.Client.get_default()
+    response = _call_with_retries(aai.api.get_transcript, client.http_client, transcript_id)
+    return _transcription_result(aai.Transcript.from_response(client=client, response=response))
+
+
+def _transcription_result(transcript) -> Dict:
+    """Convert a finished AssemblyAI transcript into the app's transcription dict."""
+    # Debug: transcription details
+    logger.debug("Transcription ID: %s", transcript.id)
+    logger.debug("Status: %s", transcript.status)
+    
+    # Check for errors, and for jobs that are still queued or processing
     if transcript.status == "error":
         raise Exception(f"Transcripción fallida: {transcript.error}")
+    if transcript.status != "completed":
+        status = getattr(transcript.status, "value", transcript.status)
+        raise Exception(f"La transcripción {transcript.id} aún no ha terminado (estado: {status})")
     
-    # Format conversation for GPT-5
-    formatted_conversation = format_conversation(transcript.utterances)
+    # Get language detection info
+    language_detected = getattr(transcript, 'language_code', 'unknown')
+    language_confidence = getattr(transcript, 'language_confidence', 'N/A')
+    
+    logger.debug("Language detected: %s", language_detected)
+    logger.debug("Language confidence: %s", language_confidence)
+    
+    if transcript.utterances:
+        first = transcript.utterances[0]
+        logger.debug("First utterance: Speaker %s: %.100s...", first.speaker, first.text)
     
     # Prepare utterances data
     utterances_data = [
-        {
-            "speaker": utterance.speaker,
-            "text": utterance.text,
-            "start": utterance.start,
-            "end": utterance.end,
-            "confidence": utterance.confidence
-        }
-        for utterance in transcript.utterances
+        Utterance(
+            speaker=utterance.speaker,
+            text=utterance.text,
+            start=utterance.start,
+            end=utterance.end,
+            confidence=utterance.confidence
+        )
+        for utterance in transcript.utterances or []
     ]
     
+    # Format conversation for GPT-5 from the slotted copies (one join, no second pass over the SDK objects)
+    formatted_conversation = format_conversation(utterances_data)
+    
     # Build response
     result = {
         "formatted_conversation": formatted_conversation,
@@ -179,7 +543,8 @@ def transcribe_audio(audio_file_path: str) -> Dict:
             "language_confidence": getattr(transcript, 'language_confidence', None),
             "transcript_id": transcript.id,
             "status": transcript.status,
-            "audio_duration": getattr(transcript, 'audio_duration', None)
+            "audio_duration": getattr(transcript, 'audio_duration', None),
+            **_utterance_counts(utterances_data)
         }
     }
     
@@ -190,20 +555,25 @@ def format_conversation(utterances) -> str:
     """
     Format utterances into a simple conversation string.
     
+    Consecutive turns of the same speaker are merged into one line, which
+    keeps the report input shorter without losing any text.
+    
     Args:
-        utterances: List of utterance objects from AssemblyAI
+        utterances: List of utterance objects (AssemblyAI or Utterance), each
+            exposing .speaker and .text
         
     Returns:
-        Formatted string: "Speaker A: text\\nSpeaker B: text..."
+        Formatted string: "Interlocutor A: text\\n\\nInterlocutor B: text..."
     """
-    conversation_lines = []
-    
+    lines = []
+    previous_speaker = None
     for utterance in utterances:
-        speaker = utterance.speaker if hasattr(utterance, 'speaker') else "Desconocido"
-        text = utterance.text if hasattr(utterance, 'text') else ""
-        conversation_lines.append(f"Interlocutor {speaker}: {text}")
-    
-    return "\n\n".join(conversation_lines)
+        if utterance.speaker == previous_speaker:
+            lines[-1] += " " + utterance.text
+        else:
+            lines.append("Interlocutor %s: %s" % (utterance.speaker, utterance.text))
+            previous_speaker = utterance.speaker
+    return "\n\n".join(lines)
 
 
 def load_transcription_from_json(json_data: Dict) -> Dict:
@@ -212,7 +582,7 @@ def load_transcription_from_json(json_data: Dict) -> Dict:
     
     Args:
         json_data: Dictionary containing transcription data with structure:
-            - utterances: List of utterance dicts with speaker, text, start, end, confidence
+            - utterances: List of utterance dicts (or Utterance objects) with speaker, text, start, end, confidence
             - full_transcript: Optional complete transcript text
             - metadata: Optional metadata dict
             
@@ -220,29 +590,34 @@ def load_transcription_from_json(json_data: Dict) -> Dict:
         Dictionary with the same structure as transcribe_audio() returns:
             - formatted_conversation: Simple string format
             - full_transcript: Complete transcript text
-            - utterances: List of utterance dictionaries
-            - metadata: Additional info
+            - utterances: List of Utterance objects
+            - metadata: Additional info, including num_utterances and num_speakers
     """
-    # Extract utterances
-    utterances = json_data.get('utterances', [])
+    # Build the utterances, the conversation lines and the transcript parts in one pass
+    utterances = []
+    conversation_lines = []
+    transcript_parts = []
+    previous_speaker = None
+    for u in json_data.get('utterances', []):
+        utterance = u if isinstance(u, Utterance) else Utterance.from_dict(u)
+        utterances.append(utterance)
+        if utterance.speaker == previous_speaker:
+            conversation_lines[-1] += " " + utterance.text
+        else:
+            conversation_lines.append("Interlocutor %s: %s" % (utterance.speaker, utterance.text))
+            previous_speaker = utterance.speaker
+        transcript_parts.append(utterance.text)
     if not utterances:
         raise ValueError("No se encontraron intervenciones en los datos JSON")
     
-    # Format conversation from utterances (handle dict format)
-    conversation_lines = []
-    for utterance in utterances:
-        speaker = utterance.get('speaker', 'Desconocido')
-        text = utterance.get('text', '')
-        conversation_lines.append(f"Interlocutor {speaker}: {text}")
+    # Same layout as format_conversation()
     formatted_conversation = "\n\n".join(conversation_lines)
     
     # Get full transcript or generate from utterances
-    full_transcript = json_data.get('full_transcript', '')
-    if not full_transcript and utterances:
-        full_transcript = " ".join(u.get('text', '') for u in utterances)
+    full_transcript = json_data.get('full_transcript', '') or " ".join(transcript_parts)
     
-    # Extract metadata
-    metadata = json_data.get('metadata', {})
+    # Extract metadata, refreshing the counts for the utterances actually loaded
+    metadata = {**json_data.get('metadata', {}), **_utterance_counts(utterances)}
     
     return {
         "formatted_conversation": formatted_conversation,
@@ -252,48 +627,101 @@ def load_transcription_from_json(json_data: Dict) -> Dict:
     }
 
 
-def save_transcription(transcription_data: Dict, audio_filename: str) -> str:
+# Sequence number that keeps filenames unique when several saves share a second
+_save_counter = itertools.count()
+
+# Where save_transcription() writes, relative to the working directory
+TRANSCRIPTIONS_DIR = "transcriptions"
+
+
+@functools.lru_cache(maxsize=None)
+def _ensure_dir(path: str) -> str:
+    """Create a directory on first use only (later saves skip the mkdir syscalls)."""
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _open_for_write(path: str, *args, **kwargs):
+    """open() that re-creates the parent directory once if it was deleted at runtime."""
+    try:
+        return open(path, *args, **kwargs)
+    except FileNotFoundError:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        return open(path, *args, **kwargs)
+
+
+def save_transcription(transcription_data: Dict, audio_filename: str, lite: bool = False) -> str:
     """
     Save transcription data to JSON file in transcriptions/ folder.
     
     Args:
         transcription_data: Dictionary with transcription data
         audio_filename: Original audio filename
+        lite: Keep only speaker and text per utterance (drops start, end and
+            confidence, which report generation does not use); the file still
+            loads in test mode
         
     Returns:
         Path to saved JSON file
     """
+    if lite:
+        transcription_data = {
+            **transcription_data,
+            "utterances": [
+                {"speaker": u.speaker, "text": u.text}
+                for u in transcription_data["utterances"]
+            ]
+        }
+    
     # Create transcriptions directory if it doesn't exist
-    os.makedirs("transcriptions", exist_ok=True)
+    _ensure_dir(TRANSCRIPTIONS_DIR)
     
-    # Generate filename with timestamp
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    # Generate filename with timestamp (local time) and sequence number
+    timestamp = time.strftime("%Y%m%d_%H%M%S")
     # Remove extension from audio filename
     audio_name = os.path.splitext(audio_filename)[0]
-    json_filename = f"transcription_{timestamp}_{audio_name}.json"
-    json_filepath = os.path.join("transcriptions", json_filename)
+    json_filename = f"transcription_{timestamp}_{next(_save_counter):04d}_{audio_name}.json"
+    if COMPRESS_TRANSCRIPTIONS:
+        json_filename += ".zst"
+    json_filepath = os.path.join(TRANSCRIPTIONS_DIR, json_filename)
+    # Write to a temporary name and rename at the end, so readers never see a partial file
+    tmp_filepath = json_filepath + ".tmp"
     
-    # Save to JSON
-    with open(json_filepath, "w", encoding="utf-8") as f:
-        json.dump(transcription_data, f, indent=2, ensure_ascii=False)
+    try:
+        # Save to JSON (orjson serializes the Utterance dataclasses natively, as UTF-8,
+        # into one bytes object written with a single unbuffered write)
+        if COMPRESS_TRANSCRIPTIONS:
+            if ORJSON_AVAILABLE:
+                data = orjson.dumps(transcription_data, option=orjson.OPT_NON_STR_KEYS)
+            else:
+                data = json.dumps(transcription_data, ensure_ascii=False, default=_json_default).encode("utf-8")
+            with _open_for_write(tmp_filepath, "wb", buffering=0) as f:
+                f.write(zstandard.ZstdCompressor(level=3).compress(data))
+        elif ORJSON_AVAILABLE:
+            with _open_for_write(tmp_filepath, "wb", buffering=0) as f:
+                f.write(orjson.dumps(
+                    transcription_data,
+                    option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS
+                ))
+        else:
+            # json.dump streams the iterencode() chunks straight into the file;
+            # the large buffer turns those many small pieces into few writes
+            with _open_for_write(tmp_filepath, "w", encoding="utf-8", buffering=1 << 20) as f:
+                json.dump(transcription_data, f, indent=2, ensure_ascii=False, default=_json_default)
+        os.replace(tmp_filepath, json_filepath)
+    except Exception:
+        # Don't leave the partial file behind when serialization or the rename fails
+        try:
+            os.unlink(tmp_filepath)
+        except OSError:
+            pass
+        raise
     
     return json_filepath
 
 
-def generate_report(formatted_conversation: str) -> str:
-    """
-    Generate sales visit report using OpenAI GPT-5 Responses API with stored prompt.
-    
-    Args:
-        formatted_conversation: Formatted conversation string with speaker labels
-        
-    Returns:
-        Markdown formatted report
-        
-    Raises:
-        ValueError: If API key or prompt ID is missing or SDK not available
-        Exception: If report generation fails
-    """
+def _report_request(formatted_conversation: str, visit_details: str):
+    """Return the OpenAI client and Responses API arguments for a report."""
     if not OPENAI_AVAILABLE:
         raise ImportError("SDK de OpenAI no instalado. Instálalo con: pip install openai")
     
@@ -309,34 +737,53 @@ def generate_report(formatted_conversation: str) -> str:
     if not prompt_id:
         raise ValueError("OPENAI_PROMPT_ID no está configurado en las variables de entorno ni en los secretos de Streamlit. Añádelo a tu configuración.")
     
-    # Initialize OpenAI client
-    client = OpenAI(api_key=api_key)
-    
-    # Prepare input for GPT-5 - the stored prompt contains all instructions
+    # Prepare input for GPT-5 - the stored prompt contains all instructions.
+    # The sections are assembled here in a single pass rather than pre-concatenated by the caller.
     input_text = f"""TRANSCRIPCIÓN DE LA VISITA COMERCIAL:
 
-{formatted_conversation}
+{visit_details}{formatted_conversation}
 
 ---
 
 Por favor, genera una ficha post-visita completa siguiendo la plantilla especificada."""
     
+    # Shared OpenAI client for this key
+    return _get_openai_client(api_key), {
+        "prompt": {
+            "id": prompt_id,
+            "version": prompt_version
+        },
+        "input": input_text,
+        "text": {},
+        "max_output_tokens": 16384,
+        "store": True
+    }
+
+
+def generate_report(formatted_conversation: str, visit_details: str = "") -> str:
+    """
+    Generate sales visit report using OpenAI GPT-5 Responses API with stored prompt.
+    
+    Args:
+        formatted_conversation: Formatted conversation string with speaker labels
+        visit_details: Optional visit details section placed before the conversation
+        
+    Returns:
+        Markdown formatted report
+        
+    Raises:
+        ValueError: If API key or prompt ID is missing or SDK not available
+        Exception: If report generation fails
+    """
+    client, request = _report_request(formatted_conversation, visit_details)
+    
     # Generate report using Responses API with stored prompt
     try:
-        response = client.responses.create(
-            prompt={
-                "id": prompt_id,
-                "version": prompt_version
-            },
-            input=input_text,
-            text={},
-            max_output_tokens=16384,
-            store=True
-        )
+        response = client.responses.create(**request)
         
         # Check for incomplete response
         if hasattr(response, 'status') and response.status == "incomplete":
-            print(f"Warning: Response incomplete ({response.incomplete_details.reason})")
+            logger.warning("Response incomplete (%s)", response.incomplete_details.reason)
         
         return response.output_text
         
@@ -344,6 +791,176 @@ Por favor, genera una ficha post-visita completa siguiendo la plantilla especifi
         raise Exception(f"No se pudo generar el informe: {str(e)}")
 
 
+def generate_report_stream(formatted_conversation: str, visit_details: str = "") -> Iterator[str]:
+    """
+    Generate a report like generate_report(), yielding the text as it arrives.
+    
+    Lets the UI show the report while GPT-5 is still writing it (e.g. with
+    st.write_stream) instead of waiting for the whole response.
+    
+    Args:
+        formatted_conversation: Formatted conversation string with speaker labels
+        visit_details: Optional visit details section placed before the conversation
+        
+    Yields:
+        Chunks of the Markdown report
+    """
+    client, request = _report_request(formatted_conversation, visit_details)
+    
+    try:
+        stream = client.responses.create(**request, stream=True)
+        for event in stream:
+            if event.type == "response.output_text.delta":
+                yield event.delta
+            elif event.type == "response.incomplete":
+                logger.warning("Response incomplete (%s)", event.response.incomplete_details.reason)
+            elif event.type in ("response.failed", "error"):
+                raise RuntimeError(getattr(event, "message", None) or event.response.error.message)
+    except Exception as e:
+        raise Exception(f"No se pudo generar el informe: {str(e)}")
+
+
+# How long (seconds) an identical report request is served from the cache
+REPORT_CACHE_TTL = 24 * 3600
+
+# Directory for the on-disk report cache; set REPORT_CACHE_DIR to "" to disable it
+REPORT_CACHE_DIR = os.getenv("REPORT_CACHE_DIR", os.path.join("reports", "cache"))
+
+
+def _report_cache_path(
+    formatted_conversation: str,
+    visit_details: str,
+    prompt_id: Optional[str],
+    prompt_version: Optional[str]
+) -> Optional[str]:
+    """Path of the on-disk cache entry for a report request (None when disabled)."""
+    if not REPORT_CACHE_DIR:
+        return None
+    
+    key = hashlib.blake2b(digest_size=20)
+    for part in (prompt_id or "", prompt_version or "", visit_details, formatted_conversation):
+        key.update(part.encode("utf-8"))
+        key.update(b"\0")
+    return os.path.join(REPORT_CACHE_DIR, f"{key.hexdigest()}.md")
+
+
+def _read_cached_report(cache_path: Optional[str]) -> Optional[str]:
+    """Return a cached report younger than REPORT_CACHE_TTL, if any."""
+    if not cache_path:
+        return None
+    # Disk hit: survives app restarts
+    try:
+        if time.time() - os.path.getmtime(cache_path) < REPORT_CACHE_TTL:
+            with open(cache_path, "r", encoding="utf-8") as f:
+                return f.read()
+    except OSError:
+        pass
+    return None
+
+
+def _write_cached_report(cache_path: Optional[str], report: str) -> None:
+    """Store a report in the disk cache (atomically, via a temporary file)."""
+    if not cache_path:
+        return
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    # A full or read-only disk only costs the cache entry, never the report
+    try:
+        _ensure_dir(REPORT_CACHE_DIR)
+        with _open_for_write(tmp_path, "w", encoding="utf-8") as f:
+            f.write(report)
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        logger.warning("Could not write report cache %s: %s", cache_path, e)
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+
+
+def generate_report_stream_cached(formatted_conversation: str, visit_details: str = "") -> Iterator[str]:
+    """
+    Stream a report, replaying it from the disk cache when available.
+    
+    Reports are keyed on the conversation, the visit details and the stored
+    prompt ID/version, so changing any of them (e.g. a new prompt version while
+    tuning it in test mode) generates a fresh report. On a miss the report is
+    streamed from GPT-5 and written to REPORT_CACHE_DIR once the stream has
+    been fully consumed (as st.write_stream does), so restarts reuse it too.
+    
+    Args:
+        formatted_conversation: Formatted conversation string with speaker labels
+        visit_details: Optional visit details block placed before the conversation
+        
+    Yields:
+        Chunks of the Markdown report
+    """
+    cache_path = _report_cache_path(
+        formatted_conversation,
+        visit_details,
+        _get_secret_value("OPENAI_PROMPT_ID"),
+        _get_secret_value("OPENAI_PROMPT_VERSION", "1")
+    )
+    cached = _read_cached_report(cache_path)
+    if cached is not None:
+        yield cached
+        return
+    
+    chunks = []
+    for chunk in generate_report_stream(formatted_conversation, visit_details):
+        chunks.append(chunk)
+        yield chunk
+    _write_cached_report(cache_path, "".join(chunks))
+
+
+async def transcribe_audio_async(audio_source: Union[str, BinaryIO]) -> Dict:
+    """
+    transcribe_audio() for asyncio callers (e.g. a FastAPI endpoint).
+    
+    The blocking SDK call runs in a worker thread, so the event loop keeps
+    serving other requests during the transcription.
+    
+    Args:
+        audio_source: Path to the audio file or a binary file-like object
+        
+    Returns:
+        Same structure as transcribe_audio()
+    """
+    return await asyncio.to_thread(transcribe_audio, audio_source)
+
+
+async def generate_report_async(formatted_conversation: str, visit_details: str = "") -> str:
+    """
+    generate_report() for asyncio callers; the API call runs in a worker thread.
+    
+    Args:
+        formatted_conversation: Formatted conversation string with speaker labels
+        visit_details: Optional visit details section placed before the conversation
+        
+    Returns:
+        Markdown formatted report
+    """
+    return await asyncio.to_thread(generate_report, formatted_conversation, visit_details)
+
+
+async def save_transcription_async(
+    transcription_data: Dict,
+    audio_filename: str,
+    lite: bool = False
+) -> str:
+    """
+    save_transcription() for asyncio callers; the file write runs in a worker thread.
+    
+    Args:
+        transcription_data: Dictionary with transcription data
+        audio_filename: Original audio filename
+        lite: Keep only speaker and text per utterance
+        
+    Returns:
+        Path to saved JSON file
+    """
+    return await asyncio.to_thread(save_transcription, transcription_data, audio_filename, lite)
+
+
 def validate_api_keys() -> Dict[str, bool]:
     """
     Validate that required API keys and configuration are present.
@@ -357,3 +974,12 @@ def validate_api_keys() -> Dict[str, bool]:
         "openai_prompt": bool(_get_secret_value("OPENAI_PROMPT_ID")),
     }
 
+
+# Keys don't change while the app runs: check them once per process.
+# validate_api_keys.clear() forces a fresh check on the next call.
+if STREAMLIT_AVAILABLE and st.runtime.exists():
+    validate_api_keys = st.cache_resource(show_spinner=False)(validate_api_keys)
+else:
+    validate_api_keys = functools.lru_cache(maxsize=1)(validate_api_keys)
+    validate_api_keys.clear = validate_api_keys.cache_clear
+